@@ -1,11 +1,47 @@
-from flask import Flask, request, redirect, url_for, render_template_string, session
+import click
+from flask import Flask, request, redirect, url_for, render_template_string, session, jsonify, Response, stream_with_context, g, has_request_context
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd
-import os, csv
-import plotly.express as px
-import folium
+import os, csv, io, threading, sqlite3, hashlib, gzip, json, base64, binascii, time, cProfile, pstats
+import importlib, importlib.util, hmac, math
 from datetime import timedelta
 from functools import wraps
+from collections import namedtuple, OrderedDict
+from urllib.parse import urlencode
+from html import escape as html_escape
+from contextlib import contextmanager
+import tempfile
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking
+    fcntl = None
+
+# pyarrow is optional: without it there is no columnar cache and CSVs are parsed on load
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+class LazyModule:
+    """Stands in for a heavy module until first use.
+
+    pandas, numpy, plotly and folium take about a second to import, which CLI
+    commands and tests that never touch a table shouldn't pay. The first
+    attribute access imports the module and rebinds the global name, so later
+    lookups go straight to the real module.
+    """
+
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+pd = LazyModule("pandas", "pd")
+np = LazyModule("numpy", "np")
+px = LazyModule("plotly.express", "px")
+folium = LazyModule("folium", "folium")
 
 app = Flask(__name__)
 app.secret_key = "Group7"
@@ -21,6 +57,8 @@ DEPOSITS_FILE = "sites.csv"
 COUNTRY_FILE = "countries.csv"
 PROD_TS_FILE = "production_stats.csv"
 ROLES_FILE = "roles.csv"
+PRICES_FILE = "prices.csv"
+PROD_SERIES_FILE = "production_timeseries.csv"
 
 #Ensure CSVs Exist
 def ensure_csv(filename, header, default_rows=None):
@@ -31,28 +69,34 @@ def ensure_csv(filename, header, default_rows=None):
             if default_rows:
                 writer.writerows(default_rows)
 
-# Initialize files with comprehensive African mineral data
-ensure_csv(
-    ROLES_FILE,
-    ["RoleID", "RoleName", "Permissions"],
-    [
-        ["1", "Administrator", "all"],
-        ["2", "Investor", "market_data,charts"],
-        ["3", "Researcher", "view_data,charts"]
-    ]
-)
+ROLES_HEADER = ["RoleID", "RoleName", "Permissions"]
+DEFAULT_ROLES = [
+    ["1", "Administrator", "all"],
+    ["2", "Investor", "market_data,charts"],
+    ["3", "Researcher", "view_data,charts"]
+]
 
-ensure_csv(USER_FILE, ["UserID","Username","PasswordHash","RoleID","Email"])
-ensure_csv(MINERAL_FILE, ["MineralID","MineralName","Description","MarketPriceUSD_per_tonne"])
-ensure_csv(DEPOSITS_FILE, ["SiteID","SiteName","CountryID","MineralID","Latitude","Longitude","Production_tonnes"])
-ensure_csv(COUNTRY_FILE, ["CountryID","CountryName","GDP_BillionUSD","MiningRevenue_BillionUSD","KeyProjects","Population_Millions","MiningContribution_GDP"])
-ensure_csv(PROD_TS_FILE, ["StatID","Year","CountryID","MineralID","Production_tonnes","ExportValue_BillionUSD"])
+def ensure_data_files():
+    """Create any missing CSV with just its header (and the default roles)"""
+    ensure_csv(ROLES_FILE, ROLES_HEADER, DEFAULT_ROLES)
+    ensure_csv(USER_FILE, ["UserID","Username","PasswordHash","RoleID","Email"])
+    ensure_csv(MINERAL_FILE, ["MineralID","MineralName","Description","MarketPriceUSD_per_tonne"])
+    ensure_csv(DEPOSITS_FILE, ["SiteID","SiteName","CountryID","MineralID","Latitude","Longitude","Production_tonnes"])
+    ensure_csv(COUNTRY_FILE, ["CountryID","CountryName","GDP_BillionUSD","MiningRevenue_BillionUSD","KeyProjects","Population_Millions","MiningContribution_GDP"])
+    ensure_csv(PROD_TS_FILE, ["StatID","Year","CountryID","MineralID","Production_tonnes","ExportValue_BillionUSD"])
+    ensure_csv(PRICES_FILE, ["mineral","year","average_price_usd_per_tonne"])
+    ensure_csv(PROD_SERIES_FILE, ["country","mineral","year","production_tonnes","export_tonnes"])
+
+SEED_DATA_SEED = 2020
 
 # Add comprehensive African mineral data
 def add_african_mineral_data():
+    """Fill empty tables with the sample data, through the storage backend"""
+    if count_rows(ROLES_FILE) == 0:
+        seed_table(ROLES_FILE, pd.DataFrame(DEFAULT_ROLES, columns=ROLES_HEADER))
+
     # Sample minerals
-    minerals_df = pd.read_csv(MINERAL_FILE) if os.path.exists(MINERAL_FILE) else pd.DataFrame()
-    if minerals_df.empty:
+    if count_rows(MINERAL_FILE) == 0:
         sample_minerals = [
             [1, "Copper", "Industrial metal used in electrical wiring and electronics", 8500.50],
             [2, "Gold", "Precious metal for jewelry and investment", 58000000.00],
@@ -64,11 +108,10 @@ def add_african_mineral_data():
             [8, "Bauxite", "Primary ore for aluminum production", 55.00]
         ]
         minerals_df = pd.DataFrame(sample_minerals, columns=["MineralID", "MineralName", "Description", "MarketPriceUSD_per_tonne"])
-        minerals_df.to_csv(MINERAL_FILE, index=False)
+        seed_table(MINERAL_FILE, minerals_df)
 
     # Major African mining sites with real coordinates
-    sites_df = pd.read_csv(DEPOSITS_FILE) if os.path.exists(DEPOSITS_FILE) else pd.DataFrame()
-    if sites_df.empty:
+    if count_rows(DEPOSITS_FILE) == 0:
         african_mines = [
             [1, "Kamoto Copper Mine", 1, 1, -10.7167, 25.4667, 450000],
             [2, "Tenke Fungurume", 1, 5, -10.5833, 26.1667, 22000],
@@ -86,177 +129,2699 @@ def add_african_mineral_data():
             [14, "Phosboucraa Mine", 8, 7, 26.1667, -12.8333, 2800000]
         ]
         sites_df = pd.DataFrame(african_mines, columns=["SiteID", "SiteName", "CountryID", "MineralID", "Latitude", "Longitude", "Production_tonnes"])
-        sites_df.to_csv(DEPOSITS_FILE, index=False)
+        seed_table(DEPOSITS_FILE, sites_df)
+
+    # Comprehensive African countries data: Added MiningContribution_GDP column
+    if count_rows(COUNTRY_FILE) == 0:
+        african_countries = [
+            [1, "DR Congo", 58.0, 8.5, "World's largest cobalt producer, major copper and diamond producer", 95.0, 15.2],
+            [2, "South Africa", 380.0, 25.3, "World's largest platinum producer, major gold and diamond producer", 59.0, 7.8],
+            [3, "Botswana", 18.7, 4.1, "World's largest diamond producer by value", 2.4, 25.0],
+            [4, "Zambia", 22.5, 3.2, "Second largest copper producer in Africa", 19.5, 12.1],
+            [5, "Ghana", 75.0, 6.8, "Largest gold producer in Africa, significant bauxite reserves", 32.0, 8.5],
+            [6, "Guinea", 15.8, 2.1, "World's second largest bauxite producer, massive iron ore reserves", 13.5, 15.2],
+            [7, "Tanzania", 75.0, 2.8, "Fourth largest gold producer in Africa, growing mining sector", 63.0, 4.1],
+            [8, "Morocco", 126.0, 2.4, "World's largest phosphate exporter, controls 75% of global reserves", 37.5, 4.0]
+        ]
+        countries_df = pd.DataFrame(african_countries, columns=["CountryID", "CountryName", "GDP_BillionUSD", "MiningRevenue_BillionUSD", "KeyProjects", "Population_Millions", "MiningContribution_GDP"])
+        seed_table(COUNTRY_FILE, countries_df)
+        print("Created countries table with MiningContribution_GDP column")
+
+    # Generate comprehensive production data
+    if count_rows(PROD_TS_FILE) == 0:
+        # Define realistic production ranges for each country-mineral combination
+        production_ranges = {
+            # CountryID: {MineralID: (min_production, max_production, export_value_multiplier)}
+            1: {1: (400000, 500000, 0.003), 2: (70000, 90000, 40), 5: (18000, 25000, 0.8)},  # DR Congo
+            2: {2: (200000, 280000, 45), 3: (30000000, 40000000, 0.0001), 6: (4000000, 5000000, 0.6)},  # South Africa
+            3: {4: (20000000, 26000000, 6)},  # Botswana
+            4: {1: (300000, 400000, 0.003)},  # Zambia
+            5: {2: (500000, 700000, 42), 8: (800000, 1200000, 0.05)},  # Ghana
+            6: {3: (80000000, 120000000, 0.00008), 8: (15000000, 20000000, 0.05)},  # Guinea
+            7: {2: (400000, 600000, 41)},  # Tanzania
+            8: {7: (2500000, 3500000, 0.2)}  # Morocco
+        }
+        
+        # Generate data for 2020-2023 (seeded, so every run and worker gets the same numbers)
+        rng = np.random.default_rng(SEED_DATA_SEED)
+        combos = [(year, country_id, mineral_id, *bounds)
+                  for year in range(2020, 2024)
+                  for country_id, minerals in production_ranges.items()
+                  for mineral_id, bounds in minerals.items()]
+        years, country_ids, mineral_ids, min_prod, max_prod, export_multiplier = (np.array(col) for col in zip(*combos))
+        production = rng.integers(min_prod, max_prod)
+        production_data = np.column_stack([np.arange(1, len(combos) + 1), years, country_ids, mineral_ids,
+                                           production, production * export_multiplier])
+        
+        production_df = pd.DataFrame(production_data, columns=["StatID", "Year", "CountryID", "MineralID", "Production_tonnes", "ExportValue_BillionUSD"])
+        production_df = production_df.astype({"StatID": int, "Year": int, "CountryID": int, "MineralID": int, "Production_tonnes": int})
+        seed_table(PROD_TS_FILE, production_df)
+        print(f"Generated {len(production_data)} production records")
+
+# Synthetic Data
+# Large, reproducible datasets for load testing: every table is generated from
+# one seed with NumPy and written in blocks, so memory use does not grow with
+# the row count and the same seed always gives the same files.
+GENERATE_BLOCK_ROWS = 50000
+
+SEED_COUNTRIES = {
+    "DR Congo": (-2.9, 23.6), "South Africa": (-29.0, 25.0), "Botswana": (-22.3, 24.7), "Zambia": (-13.1, 27.8),
+    "Ghana": (7.9, -1.0), "Guinea": (10.4, -10.9), "Tanzania": (-6.4, 34.9), "Morocco": (31.8, -7.1),
+}
+SEED_MINERALS = ["Copper", "Gold", "Iron Ore", "Diamonds", "Cobalt", "Platinum", "Phosphates", "Bauxite"]
+
+def _block_rng(seed, table, block):
+    """Independent stream per (table, block), so blocks can be generated one at a time"""
+    return np.random.default_rng([seed, table, block])
+
+@contextmanager
+def _table_writer(path):
+    """File object for a new version of a data file, written under its lock and
+    swapped in whole; the .seq sidecar of the old version is removed"""
+    with file_lock(path):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        try:
+            os.remove(path + ".seq")
+        except FileNotFoundError:
+            pass
+
+def _write_blocks(path, blocks):
+    rows = 0
+    with _table_writer(path) as f:
+        for i, block in enumerate(blocks):
+            block.to_csv(f, index=False, header=(i == 0))
+            rows += len(block)
+    return rows
+
+def generate_dataset(directory, countries=54, minerals=30, sites=10000, years=(2000, 2024), users=100, seed=0):
+    """Write a synthetic but internally consistent set of data files into directory.
+
+    Production stats get one row per site per year, so the row count is
+    sites x years. Each table is written under its file lock and swapped in
+    whole, so directory can be the live data directory. Returns {filename: rows written}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = lambda filename: os.path.join(directory, filename)
+    rng = np.random.default_rng([seed, 0])
+    year_range = np.arange(years[0], years[1] + 1)
+    written = {}
+
+    # Reference tables
+    country_names = (list(SEED_COUNTRIES) + [f"Country {i}" for i in range(len(SEED_COUNTRIES) + 1, countries + 1)])[:countries]
+    centroids = np.array([SEED_COUNTRIES.get(name, (np.nan, np.nan)) for name in country_names])
+    missing = np.isnan(centroids[:, 0])
+    centroids[missing] = np.column_stack([rng.uniform(-30, 32, missing.sum()), rng.uniform(-12, 45, missing.sum())])
+    gdp = np.round(rng.lognormal(3.5, 1.0, countries), 1)
+    written[COUNTRY_FILE] = _write_blocks(path(COUNTRY_FILE), [pd.DataFrame({
+        "CountryID": np.arange(1, countries + 1), "CountryName": country_names, "GDP_BillionUSD": gdp,
+        "MiningRevenue_BillionUSD": np.round(gdp * rng.uniform(0.02, 0.25, countries), 2),
+        "KeyProjects": [f"Synthetic mining profile for {name}" for name in country_names],
+        "Population_Millions": np.round(rng.lognormal(3.0, 0.9, countries), 1),
+        "MiningContribution_GDP": np.round(rng.uniform(1, 30, countries), 1),
+    })])
+
+    mineral_names = (SEED_MINERALS + [f"Mineral {i}" for i in range(len(SEED_MINERALS) + 1, minerals + 1)])[:minerals]
+    base_price = np.round(rng.lognormal(8, 2.5, minerals), 2)
+    written[MINERAL_FILE] = _write_blocks(path(MINERAL_FILE), [pd.DataFrame({
+        "MineralID": np.arange(1, minerals + 1), "MineralName": mineral_names,
+        "Description": [f"Synthetic {name.lower()} commodity" for name in mineral_names],
+        "MarketPriceUSD_per_tonne": base_price,
+    })])
+
+    # Prices: a geometric random walk per mineral ending at today's price
+    steps = rng.normal(0.0, 0.12, (len(year_range), minerals))
+    walk = np.exp(steps[::-1].cumsum(axis=0)[::-1] - steps[-1])
+    written[PRICES_FILE] = _write_blocks(path(PRICES_FILE), [pd.DataFrame({
+        "mineral": np.tile(mineral_names, len(year_range)), "year": np.repeat(year_range, minerals),
+        "average_price_usd_per_tonne": np.round((walk * base_price).ravel(), 2),
+    })])
+
+    # Sites and their yearly production, block by block
+    totals = np.zeros((countries, minerals, len(year_range), 2))
+    growth = rng.normal(0.02, 0.03, minerals)
+
+    # Sites per block, so a block of production rows stays near GENERATE_BLOCK_ROWS
+    block_sites = max(1, GENERATE_BLOCK_ROWS // len(year_range))
+
+    def site_blocks():
+        for b, start in enumerate(range(0, sites, block_sites)):
+            r = _block_rng(seed, 1, b)
+            n = min(block_sites, sites - start)
+            country = r.integers(0, countries, n)
+            mineral = r.integers(0, minerals, n)
+            yield pd.DataFrame({
+                "SiteID": np.arange(start + 1, start + n + 1), "SiteName": [f"Site {i}" for i in range(start + 1, start + n + 1)],
+                "CountryID": country + 1, "MineralID": mineral + 1,
+                "Latitude": np.round(np.clip(centroids[country, 0] + r.normal(0, 2.0, n), -35, 37), 4),
+                "Longitude": np.round(np.clip(centroids[country, 1] + r.normal(0, 2.0, n), -18, 51), 4),
+                "Production_tonnes": np.round(r.lognormal(11, 1.5, n)).astype("int64"),
+            })
+
+    def production_blocks():
+        stat_id = 1
+        for b, block in enumerate(site_blocks()):
+            r = _block_rng(seed, 2, b)
+            n, y = len(block), len(year_range)
+            country = np.repeat(block["CountryID"].to_numpy() - 1, y)
+            mineral = np.repeat(block["MineralID"].to_numpy() - 1, y)
+            year_index = np.tile(np.arange(y), n)
+            trend = (1 + growth[mineral]) ** (year_index - (y - 1))
+            production = np.round(np.repeat(block["Production_tonnes"].to_numpy(), y) * trend * r.lognormal(0, 0.1, n * y))
+            export_value = production * base_price[mineral] * r.uniform(0.5, 0.95, n * y) / 1e9
+            np.add.at(totals, (country, mineral, year_index, 0), production)
+            np.add.at(totals, (country, mineral, year_index, 1), production * r.uniform(0.6, 0.9, n * y))
+            yield block, pd.DataFrame({
+                "StatID": np.arange(stat_id, stat_id + n * y), "Year": year_range[year_index],
+                "CountryID": country + 1, "MineralID": mineral + 1,
+                "Production_tonnes": production.astype("int64"), "ExportValue_BillionUSD": np.round(export_value, 6),
+            })
+            stat_id += n * y
+
+    with _table_writer(path(DEPOSITS_FILE)) as sites_file, _table_writer(path(PROD_TS_FILE)) as production_file:
+        written[DEPOSITS_FILE] = written[PROD_TS_FILE] = 0
+        for i, (site_block, production_block) in enumerate(production_blocks()):
+            site_block.to_csv(sites_file, index=False, header=(i == 0))
+            production_block.to_csv(production_file, index=False, header=(i == 0))
+            written[DEPOSITS_FILE] += len(site_block)
+            written[PROD_TS_FILE] += len(production_block)
+
+    # Country x mineral x year series, by name, from the running totals
+    c, m, y = np.nonzero(totals[..., 0])
+    written[PROD_SERIES_FILE] = _write_blocks(path(PROD_SERIES_FILE), [pd.DataFrame({
+        "country": np.array(country_names)[c], "mineral": np.array(mineral_names)[m], "year": year_range[y],
+        "production_tonnes": totals[c, m, y, 0].astype("int64"), "export_tonnes": np.round(totals[c, m, y, 1]).astype("int64"),
+    })])
+
+    # Users share one password hash ("password") so generation stays fast; the
+    # hash is salted, so users.csv is the one file that differs between runs
+    roles = np.random.default_rng([seed, 3]).integers(1, 4, users)
+    password_hash = generate_password_hash("password")
+    written[USER_FILE] = _write_blocks(path(USER_FILE), [pd.DataFrame({
+        "UserID": np.arange(1, users + 1), "Username": [f"user{i}" for i in range(1, users + 1)],
+        "PasswordHash": password_hash, "RoleID": roles, "Email": [f"user{i}@example.com" for i in range(1, users + 1)],
+    })])
+    if os.path.abspath(path(ROLES_FILE)) != os.path.abspath(ROLES_FILE):
+        if os.path.exists(ROLES_FILE):
+            shutil.copy(ROLES_FILE, path(ROLES_FILE))
+        else:
+            ensure_csv(path(ROLES_FILE), ROLES_HEADER, DEFAULT_ROLES)
+    return written
+
+def seed_table(filename, df):
+    backend.replace(filename, df)
+    store.invalidate(filename)
+
+def init_data():
+    """Fill empty tables with the sample data (flask init-data); CSV storage also gets any missing files"""
+    if backend.name == "csv":
+        ensure_data_files()
+    add_african_mineral_data()
+
+# Metrics
+# Process-local counters and histograms, served in the Prometheus text format
+# on /metrics. Under gunicorn each worker reports its own numbers.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}    # name -> (type, help, buckets)
+        self._values = {}  # (name, labels) -> counter value, or [bucket counts..., sum, count]
+
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets):
+        self._meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        with self._lock:
+            values = {key: (list(v) if isinstance(v, list) else v) for key, v in self._values.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._meta.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name != name:
+                    continue
+                if kind == "counter":
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+                    continue
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{self._labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{self._labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.histogram("mining_request_duration_seconds", "Request latency by endpoint, including streamed bodies", LATENCY_BUCKETS)
+metrics.histogram("mining_response_size_bytes", "Response body size by endpoint", SIZE_BUCKETS)
+metrics.histogram("mining_request_load_df_calls", "load_df calls made while serving one request", COUNT_BUCKETS)
+metrics.histogram("mining_request_parsed_bytes", "Bytes of CSV parsed while serving one request", SIZE_BUCKETS)
+metrics.counter("mining_load_df_calls_total", "load_df calls by table")
+metrics.counter("mining_table_reads_total", "Tables read from storage, by source (csv, columnar, sqlite)")
+metrics.counter("mining_table_parsed_bytes_total", "Bytes of CSV parsed by table")
+metrics.counter("mining_cache_requests_total", "Cache lookups by cache and result (hit or miss)")
+metrics.histogram("mining_render_seconds", "Folium map and plotly chart render time", LATENCY_BUCKETS)
+
+def request_tally(key, value=1):
+    """Add to a per-request total (reported when the request finishes)"""
+    if has_request_context():
+        setattr(g, key, g.get(key, 0) + value)
+
+def timed_render(kind):
+    """Record how long a folium/plotly render function takes"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.timer("mining_render_seconds", kind=kind, view=fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Storage Backends
+# Every table keeps the CSV schema; the backend decides where the rows live.
+STORAGE_BACKEND = os.environ.get("MINING_STORAGE", "csv")
+SQLITE_FILE = os.environ.get("MINING_DB", "mining.db")
+STREAM_CHUNK_ROWS = 1000
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+COLUMNAR_CACHE_DIR = os.environ.get("MINING_COLUMNAR_DIR", ".columnar")  # relative to APP_DIR; "" = always parse the CSV
+
+# filename -> (table name, primary key, [(column, SQL type)], indexed columns)
+TABLE_SCHEMAS = {
+    USER_FILE: ("Users", "UserID", [("UserID", "INTEGER"), ("Username", "TEXT"), ("PasswordHash", "TEXT"), ("RoleID", "INTEGER"), ("Email", "TEXT")], ["Username", "RoleID"]),
+    MINERAL_FILE: ("Minerals", "MineralID", [("MineralID", "INTEGER"), ("MineralName", "TEXT"), ("Description", "TEXT"), ("MarketPriceUSD_per_tonne", "REAL")], []),
+    DEPOSITS_FILE: ("Sites", "SiteID", [("SiteID", "INTEGER"), ("SiteName", "TEXT"), ("CountryID", "INTEGER"), ("MineralID", "INTEGER"), ("Latitude", "REAL"), ("Longitude", "REAL"), ("Production_tonnes", "REAL")], ["CountryID", "MineralID"]),
+    COUNTRY_FILE: ("Countries", "CountryID", [("CountryID", "INTEGER"), ("CountryName", "TEXT"), ("GDP_BillionUSD", "REAL"), ("MiningRevenue_BillionUSD", "REAL"), ("KeyProjects", "TEXT"), ("Population_Millions", "REAL"), ("MiningContribution_GDP", "REAL")], []),
+    PROD_TS_FILE: ("ProductionStats", "StatID", [("StatID", "INTEGER"), ("Year", "INTEGER"), ("CountryID", "INTEGER"), ("MineralID", "INTEGER"), ("Production_tonnes", "REAL"), ("ExportValue_BillionUSD", "REAL")], ["CountryID", "MineralID", "Year"]),
+    ROLES_FILE: ("Roles", "RoleID", [("RoleID", "INTEGER"), ("RoleName", "TEXT"), ("Permissions", "TEXT")], []),
+    PRICES_FILE: ("Prices", None, [("mineral", "TEXT"), ("year", "INTEGER"), ("average_price_usd_per_tonne", "REAL")], ["mineral", "year"]),
+    PROD_SERIES_FILE: ("ProductionTimeseries", None, [("country", "TEXT"), ("mineral", "TEXT"), ("year", "INTEGER"), ("production_tonnes", "REAL"), ("export_tonnes", "REAL")], ["country", "mineral", "year"]),
+}
+
+_held_locks = threading.local()
+_thread_locks = {}
+
+@contextmanager
+def file_lock(filename):
+    """Exclusive lock on a data file, shared across threads and gunicorn workers (re-entrant per thread)"""
+    held = getattr(_held_locks, "files", None)
+    if held is None:
+        held = _held_locks.files = set()
+    if filename in held:
+        yield
+        return
+
+    if fcntl is not None:
+        with open(filename + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held.add(filename)
+            try:
+                yield
+            finally:
+                held.discard(filename)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock = _thread_locks.setdefault(filename, threading.Lock())
+        with lock:
+            held.add(filename)
+            try:
+                yield
+            finally:
+                held.discard(filename)
+
+
+# In-memory column types per table. IDs and years are downcast to the smallest
+# integer type that fits the domain, repeated names are categoricals; columns
+# not listed keep the type pandas infers.
+TABLE_DTYPES = {
+    USER_FILE: {"UserID": "int32", "RoleID": "int8"},
+    MINERAL_FILE: {"MineralID": "int16", "MineralName": "category", "MarketPriceUSD_per_tonne": "float64"},
+    DEPOSITS_FILE: {"SiteID": "int32", "CountryID": "int16", "MineralID": "int16", "Latitude": "float64",
+                    "Longitude": "float64", "Production_tonnes": "float64"},
+    COUNTRY_FILE: {"CountryID": "int16", "CountryName": "category", "GDP_BillionUSD": "float64",
+                   "MiningRevenue_BillionUSD": "float64", "Population_Millions": "float64",
+                   "MiningContribution_GDP": "float64"},
+    PROD_TS_FILE: {"StatID": "int32", "Year": "int16", "CountryID": "int16", "MineralID": "int16",
+                   "Production_tonnes": "float64", "ExportValue_BillionUSD": "float64"},
+    ROLES_FILE: {"RoleID": "int8", "RoleName": "category"},
+    PRICES_FILE: {"mineral": "category", "year": "int16", "average_price_usd_per_tonne": "float64"},
+    PROD_SERIES_FILE: {"country": "category", "mineral": "category", "year": "int16",
+                       "production_tonnes": "float64", "export_tonnes": "float64"},
+}
+
+# Wide free-text columns kept out of the cached frames; views that show them
+# pull them in for the rows on screen with with_text().
+LAZY_TEXT_COLUMNS = {
+    MINERAL_FILE: ["Description"],
+    COUNTRY_FILE: ["KeyProjects"],
+}
+
+def apply_table_dtypes(df, filename):
+    """Cast columns to TABLE_DTYPES; integer columns with gaps or out-of-range values stay float/int64"""
+    converted = {}
+    for col, dtype in TABLE_DTYPES.get(filename, {}).items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            converted[col] = df[col].astype("category")
+        elif dtype.startswith("int"):
+            values = pd.to_numeric(df[col], errors="coerce")
+            info = np.iinfo(dtype)
+            if values.notna().all() and (values % 1 == 0).all() and \
+                    (values.empty or (values.min() >= info.min and values.max() <= info.max)):
+                converted[col] = values.astype(dtype)
+        else:
+            converted[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df.assign(**converted) if converted else df
+
+class ColumnarCache:
+    """Feather copy of each CSV with fixed dtypes, so reloads skip CSV parsing.
+
+    Each file is one uncompressed record batch, memory-mapped on read, so
+    numeric and categorical columns come back as read-only views of the
+    mapping rather than copies (columns with nulls, and filtered rows, are
+    still copied). The name carries the CSV's path, mtime and size, so an
+    edited CSV never matches an old copy; stale copies are removed on write.
+    Without pyarrow the cache is off: it never falls back to pickle, since
+    loading a planted pickle runs arbitrary code.
+    """
+
+    suffix = ".feather"
+
+    def __init__(self, directory):
+        self.directory = os.path.join(APP_DIR, directory) if directory and HAVE_PYARROW else ""
+
+    def _prefix(self, filename):
+        source = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()[:12]
+        return f"{os.path.basename(filename)}.{source}."
+
+    def _path(self, filename, sig):
+        return os.path.join(self.directory, f"{self._prefix(filename)}{sig[0]}-{sig[1]}{self.suffix}")
+
+    def load(self, filename, sig, exclude=(), columns=None, rows=None):
+        """The cached frame, without `exclude` or with just `columns`; None if there is no current copy.
+
+        rows=(column, values) keeps only rows whose column is in values,
+        filtered before the frame is built.
+        """
+        if not self.directory or sig is None:
+            return None
+        path = self._path(filename, sig)
+        try:
+            from pyarrow import feather
+            table = feather.read_table(path, memory_map=True)
+            if columns is not None:
+                table = table.select([c for c in columns if c in table.column_names])
+            else:
+                table = table.drop_columns([c for c in exclude if c in table.column_names])
+            if rows is not None:
+                import pyarrow as pa, pyarrow.compute as pc
+                column, values = rows
+                table = table.filter(pc.is_in(table[column], value_set=pa.array(values, type=table[column].type)))
+            # split_blocks keeps each column on its own buffer instead of copying into 2-D blocks
+            return table.to_pandas(split_blocks=True)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable columnar cache {path}: {e}")
+            return None
+
+    def store(self, filename, sig, df):
+        if not self.directory or sig is None:
+            return
+        path = self._path(filename, sig)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            import pyarrow as pa
+            from pyarrow import feather
+            table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False).combine_chunks()
+            feather.write_feather(table, tmp, compression="uncompressed", chunksize=max(table.num_rows, 1))
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Could not write columnar cache {path}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        prefix = self._prefix(filename)
+        for name in os.listdir(self.directory):
+            stale = os.path.join(self.directory, name)
+            if name.startswith(prefix) and name.endswith(self.suffix) and stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+class CsvBackend:
+    """Flat CSV files: appends under a cross-process lock, rewrites via temp file + rename"""
+
+    name = "csv"
+
+    def __init__(self, columnar_dir=COLUMNAR_CACHE_DIR):
+        self.columnar = ColumnarCache(columnar_dir)
+
+    def signature(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def after_fork(self):
+        pass
+
+    def read_table(self, filename, exclude=()):
+        sig = self.signature(filename)
+        df = self.columnar.load(filename, sig, exclude)
+        if df is not None:
+            metrics.inc("mining_table_reads_total", table=filename, source="columnar")
+            return df
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            metrics.inc("mining_table_reads_total", table=filename, source="csv")
+            metrics.inc("mining_table_parsed_bytes_total", sig[1], table=filename)
+            request_tally("parsed_bytes", sig[1])
+            try:
+                df = apply_table_dtypes(pd.read_csv(filename), filename)
+            except Exception as e:
+                print(f"Error loading {filename}: {e}")
+                return pd.DataFrame()
+            # Only keep the copy if the CSV did not change while it was parsed
+            if self.signature(filename) == sig:
+                self.columnar.store(filename, sig, df)
+            return df.drop(columns=list(exclude), errors="ignore")
+        return pd.DataFrame()
+
+    def read_text(self, filename, id_col, columns, ids):
+        """The ID and text columns of just the rows with these IDs, from the columnar
+        copy or a chunked usecols parse of the CSV"""
+        wanted = [id_col] + list(columns)
+        sig = self.signature(filename)
+        df = self.columnar.load(filename, sig, columns=wanted, rows=(id_col, list(ids)))
+        if df is not None:
+            metrics.inc("mining_table_reads_total", table=filename, source="columnar")
+            return df
+        if not (os.path.exists(filename) and os.path.getsize(filename) > 0):
+            return pd.DataFrame(columns=wanted)
+        metrics.inc("mining_table_reads_total", table=filename, source="csv")
+        metrics.inc("mining_table_parsed_bytes_total", sig[1], table=filename)
+        request_tally("parsed_bytes", sig[1])
+        ids = set(ids)
+        parts = [chunk[chunk[id_col].isin(ids)]
+                 for chunk in pd.read_csv(filename, usecols=lambda c: c in wanted, chunksize=50000)]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=wanted)
+
+    def next_id(self, filename, id_col):
+        """The next free ID for a table (call under file_lock, then _record_seq once written).
+
+        The .seq sidecar holds the last issued ID and the table's signature
+        after that write. If the table has changed since (hand edits,
+        generate-data, db-export), the sidecar is not trusted on its own and
+        the table is scanned too, so an ID in the file is never handed out again.
+        """
+        last_id, sig = 0, None
+        try:
+            with open(filename + ".seq") as f:
+                parts = f.read().split()
+            last_id = int(parts[0])
+            sig = tuple(int(p) for p in parts[1:3]) if len(parts) == 3 else None
+        except (OSError, ValueError, IndexError):
+            pass
+        if sig is None or sig != self.signature(filename):
+            df = load_df(filename)
+            if not df.empty and df[id_col].notna().any():
+                last_id = max(last_id, int(df[id_col].max()))
+        return last_id + 1
+
+    def _record_seq(self, filename, last_id):
+        """Save the last issued ID with the table's current signature"""
+        sig = self.signature(filename)
+        tmp = filename + ".seq.tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{last_id} {sig[0]} {sig[1]}" if sig else str(last_id))
+        os.replace(tmp, filename + ".seq")
+
+    def append(self, filename, row, id_col=None):
+        with file_lock(filename):
+            if id_col is not None:
+                row = dict(row, **{id_col: self.next_id(filename, id_col)})
+
+            header = None
+            if os.path.exists(filename) and os.path.getsize(filename) > 0:
+                with open(filename, newline="", encoding="utf-8") as f:
+                    header = next(csv.reader(f))
+                with open(filename, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) not in (b"\n", b"\r")
+            else:
+                needs_newline = False
+
+            with open(filename, "a", newline="", encoding="utf-8") as f:
+                if needs_newline:
+                    f.write("\n")
+                writer = csv.writer(f)
+                if header is None:
+                    header = list(row)
+                    writer.writerow(header)
+                writer.writerow([row.get(col, "") for col in header])
+                f.flush()
+                os.fsync(f.fileno())
+            if id_col is not None:
+                self._record_seq(filename, row[id_col])
+        return row
+
+    def replace(self, filename, df):
+        with file_lock(filename):
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                    df.to_csv(f, index=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, filename)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+    def bulk_append(self, filename, chunks, id_col=None, on_chunk=None, first_id=1):
+        """Append many rows in one step: copy the file, append, fsync, rename.
+
+        Readers see either the old file or the complete new one. Rows with a
+        blank id_col get IDs after the last issued one (and not below first_id)
+        and the .seq file is moved on. on_chunk(chunk) sees each chunk as
+        written, IDs filled in.
+        """
+        with file_lock(filename):
+            exists = os.path.exists(filename) and os.path.getsize(filename) > 0
+            if exists:
+                with open(filename, newline="", encoding="utf-8") as f:
+                    header = next(csv.reader(f))
+                with open(filename, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) not in (b"\n", b"\r")
+            else:
+                header = [c for c, _ in TABLE_SCHEMAS[filename][2]]
+                needs_newline = False
+
+            next_id = None
+            if id_col is not None:
+                next_id = max(self.next_id(filename, id_col), first_id)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+            written = 0
+            try:
+                with os.fdopen(fd, "w", newline="", encoding="utf-8") as out:
+                    if exists:
+                        with open(filename, newline="", encoding="utf-8") as src:
+                            shutil.copyfileobj(src, out)
+                        if needs_newline:
+                            out.write("\n")
+                    else:
+                        csv.writer(out).writerow(header)
+                    for chunk in chunks:
+                        if id_col is not None:
+                            chunk, next_id = _fill_ids(chunk, id_col, next_id)
+                        if on_chunk is not None:
+                            on_chunk(chunk)
+                        chunk.reindex(columns=header).to_csv(out, index=False, header=False)
+                        written += len(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp, filename)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            if id_col is not None:
+                self._record_seq(filename, next_id - 1)
+        return written
+
+    def delete_rows(self, filename, **filters):
+        with file_lock(filename):
+            df = load_df(filename)
+            if df.empty:
+                return 0
+            mask = _filter_mask(df, filters)
+            if mask.any():
+                self.replace(filename, df[~mask])
+            return int(mask.sum())
+
+    # Queries run against the cached frames
+    def iter_chunks(self, filename, chunksize):
+        df = load_df(filename)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+    def count(self, filename):
+        return len(load_df(filename))
+
+    def find_rows(self, filename, **filters):
+        df = load_df(filename)
+        if df.empty:
+            return df
+        return df[_filter_mask(df, filters)]
+
+    def aggregate(self, filename, by, values):
+        df = load_df(filename)
+        if df.empty:
+            return pd.DataFrame(columns=list(by) + list(values))
+        return df.groupby(list(by))[list(values)].sum().reset_index()
+
+
+class SqliteBackend:
+    """Embedded SQLite database with the CSV tables, indexed on the lookup and join columns"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            # The database file and tables are created on first use, not at import
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self.create_schema()
+                    self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def create_schema(self):
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS "_versions" ("name" TEXT PRIMARY KEY, "version" INTEGER NOT NULL)')
+            for table, pk, columns, indexes in TABLE_SCHEMAS.values():
+                cols = ", ".join(f'"{c}" {t}{" PRIMARY KEY" if c == pk else ""}' for c, t in columns)
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+                for col in indexes:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{col}" ON "{table}" ("{col}")')
+                conn.execute('INSERT OR IGNORE INTO "_versions" VALUES (?, 0)', (table,))
+
+    def after_fork(self):
+        """Forked workers must not share the parent's connection"""
+        self._local = threading.local()
+
+    def _table(self, filename):
+        return TABLE_SCHEMAS[filename][0]
+
+    def _bump(self, conn, table):
+        conn.execute('UPDATE "_versions" SET "version" = "version" + 1 WHERE "name" = ?', (table,))
+
+    def _where(self, filters):
+        if not filters:
+            return "", []
+        return " WHERE " + " AND ".join(f'"{c}" = ?' for c in filters), [_sql_value(v) for v in filters.values()]
+
+    def signature(self, filename):
+        row = self.conn.execute('SELECT "version" FROM "_versions" WHERE "name" = ?', (self._table(filename),)).fetchone()
+        return row[0] if row else None
+
+    def read_table(self, filename, exclude=()):
+        metrics.inc("mining_table_reads_total", table=filename, source="sqlite")
+        cols = ", ".join(f'"{c}"' for c, _ in TABLE_SCHEMAS[filename][2] if c not in exclude)
+        return apply_table_dtypes(pd.read_sql_query(f'SELECT {cols} FROM "{self._table(filename)}"', self.conn), filename)
+
+    def read_text(self, filename, id_col, columns, ids):
+        cols = ", ".join(f'"{c}"' for c in [id_col] + list(columns))
+        sql = f'SELECT {cols} FROM "{self._table(filename)}"'
+        ids = [_sql_value(i) for i in ids]
+        parts = [pd.read_sql_query(f'{sql} WHERE "{id_col}" IN ({", ".join("?" * len(batch))})', self.conn, params=batch)
+                 for batch in (ids[i:i + 500] for i in range(0, len(ids), 500))]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=[id_col] + list(columns))
+
+    def append(self, filename, row, id_col=None):
+        table = self._table(filename)
+        with self.transaction() as conn:
+            if id_col is not None:
+                new_id = conn.execute(f'SELECT COALESCE(MAX("{id_col}"), 0) + 1 FROM "{table}"').fetchone()[0]
+                row = dict(row, **{id_col: new_id})
+            cols = ", ".join(f'"{c}"' for c in row)
+            conn.execute(f'INSERT INTO "{table}" ({cols}) VALUES ({", ".join("?" * len(row))})',
+                         [_sql_value(v) for v in row.values()])
+            self._bump(conn, table)
+        return row
+
+    def replace(self, filename, df):
+        table = self._table(filename)
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM "{table}"')
+            self._insert_frame(conn, table, df)
+            self._bump(conn, table)
+
+    def _insert_frame(self, conn, table, df):
+        if df.empty:
+            return
+        known = {c for c, _ in TABLE_SCHEMAS_BY_TABLE[table][2]}
+        cols = [c for c in df.columns if c in known]
+        quoted = ", ".join(f'"{c}"' for c in cols)
+        rows = ([_sql_value(v) for v in rec] for rec in df[cols].itertuples(index=False, name=None))
+        conn.executemany(f'INSERT INTO "{table}" ({quoted}) VALUES ({", ".join("?" * len(cols))})', rows)
+
+    def bulk_append(self, filename, chunks, id_col=None, on_chunk=None, first_id=1):
+        table = self._table(filename)
+        written = 0
+        with self.transaction() as conn:
+            if id_col is not None:
+                next_id = conn.execute(f'SELECT COALESCE(MAX("{id_col}"), 0) + 1 FROM "{table}"').fetchone()[0]
+                next_id = max(next_id, first_id)
+            for chunk in chunks:
+                if id_col is not None:
+                    chunk, next_id = _fill_ids(chunk, id_col, next_id)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                self._insert_frame(conn, table, chunk)
+                written += len(chunk)
+            self._bump(conn, table)
+        return written
+
+    def delete_rows(self, filename, **filters):
+        table = self._table(filename)
+        where, params = self._where(filters)
+        with self.transaction() as conn:
+            deleted = conn.execute(f'DELETE FROM "{table}"{where}', params).rowcount
+            if deleted:
+                self._bump(conn, table)
+        return deleted
+
+    def iter_chunks(self, filename, chunksize):
+        # A dedicated connection keeps the cursor open while the response streams
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield from pd.read_sql_query(f'SELECT * FROM "{self._table(filename)}"', conn, chunksize=chunksize)
+        finally:
+            conn.close()
+
+    def count(self, filename):
+        return self.conn.execute(f'SELECT COUNT(*) FROM "{self._table(filename)}"').fetchone()[0]
+
+    def find_rows(self, filename, **filters):
+        where, params = self._where(filters)
+        return pd.read_sql_query(f'SELECT * FROM "{self._table(filename)}"{where}', self.conn, params=params)
+
+    def page(self, filename, id_col, query):
+        """One list page (see paginate) in SQL: only the page's rows are read"""
+        table, col = self._table(filename), query.sort
+        clauses, params = [], []
+        for name, value in query.filters.items():
+            if isinstance(value, int):
+                clauses.append(f'"{name}" = ?')
+            else:
+                clauses.append(f'instr(lower("{name}"), ?) > 0')
+            params.append(value)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        total = self.conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+
+        # Seek past the cursor on (col, id); nulls sort last, by ID
+        cursor = decode_cursor(query.after) if query.after else None
+        text_column = dict(TABLE_SCHEMAS[filename][2]).get(col) == "TEXT"
+        if cursor is not None and cursor[0] is not None and isinstance(cursor[0], str) != text_column:
+            cursor = None  # cursor from another sort column; start over
+        if cursor is not None:
+            value, row_id = cursor
+            op = "<" if query.descending else ">"
+            if value is None:
+                clauses.append(f'"{col}" IS NULL AND "{id_col}" {op} ?')
+                params.append(row_id)
+            else:
+                clauses.append(f'("{col}" {op} ? OR ("{col}" = ? AND "{id_col}" {op} ?) OR "{col}" IS NULL)')
+                params.extend([_sql_value(value), _sql_value(value), row_id])
+        direction = "DESC" if query.descending else "ASC"
+        sql = (f'SELECT * FROM "{table}"{" WHERE " + " AND ".join(clauses) if clauses else ""} '
+               f'ORDER BY "{col}" IS NULL, "{col}" {direction}, "{id_col}" {direction} LIMIT ?')
+        rows = apply_table_dtypes(pd.read_sql_query(sql, self.conn, params=params + [query.limit + 1]), filename)
+        next_cursor = last_row_cursor(rows.iloc[:query.limit], col, id_col) if len(rows) > query.limit else None
+        return Page(rows.iloc[:query.limit], total, next_cursor)
+
+    def aggregate(self, filename, by, values):
+        group = ", ".join(f'"{c}"' for c in by)
+        sums = ", ".join(f'SUM("{c}") AS "{c}"' for c in values)
+        return pd.read_sql_query(
+            f'SELECT {group}, {sums} FROM "{self._table(filename)}" GROUP BY {group} ORDER BY {group}', self.conn)
+
+    def import_csv(self, filename, chunksize=50000):
+        """Replace a table with the contents of its CSV file, streamed in chunks"""
+        table = self._table(filename)
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM "{table}"')
+            if os.path.exists(filename) and os.path.getsize(filename) > 0:
+                for chunk in pd.read_csv(filename, chunksize=chunksize):
+                    self._insert_frame(conn, table, chunk)
+            self._bump(conn, table)
+        return self.count(filename)
+
+    def export_csv(self, filename, chunksize=50000):
+        """Write a table back out to its CSV file"""
+        table = self._table(filename)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            header = True
+            for chunk in pd.read_sql_query(f'SELECT * FROM "{table}"', self.conn, chunksize=chunksize):
+                chunk.to_csv(f, index=False, header=header)
+                header = False
+            if header:
+                f.write(",".join(c for c, _ in TABLE_SCHEMAS[filename][2]) + "\n")
+        os.replace(tmp, filename)
+        return self.count(filename)
+
+
+TABLE_SCHEMAS_BY_TABLE = {schema[0]: schema for schema in TABLE_SCHEMAS.values()}
+
+def _sql_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, "item"):  # numpy scalar
+        return value.item()
+    return value
+
+def _fill_ids(chunk, id_col, next_id):
+    """Give rows with a blank id_col consecutive IDs from next_id; returns (chunk, next free ID).
+
+    Blanks are numbered after the chunk's explicit IDs so they never reuse one.
+    """
+    if id_col in chunk.columns:
+        ids = pd.to_numeric(chunk[id_col], errors="coerce")
+    else:
+        ids = pd.Series(np.nan, index=chunk.index)
+    if ids.notna().any():
+        next_id = max(next_id, int(ids.max()) + 1)
+    missing = ids.isna().to_numpy()
+    ids[missing] = np.arange(next_id, next_id + int(missing.sum()))
+    next_id += int(missing.sum())
+    return chunk.assign(**{id_col: ids.astype("int64")}), next_id
+
+def _filter_mask(df, filters):
+    mask = pd.Series(True, index=df.index)
+    for col, value in filters.items():
+        mask &= df[col] == value
+    return mask
+
+def make_backend(kind=STORAGE_BACKEND):
+    if kind == "sqlite":
+        return SqliteBackend(SQLITE_FILE)
+    return CsvBackend()
+
+backend = make_backend()
+
+# Data Store
+class DataStore:
+    """Thread-safe in-process cache of the data tables.
+
+    Each table is loaded once from the storage backend and kept in memory; it
+    is only re-read when the backend reports a new signature (file mtime/size
+    for CSV, a per-table version counter for SQLite). Frames handed out are
+    shared between requests, so callers must treat them as read-only.
+    """
+
+    def __init__(self, files, backend):
+        self.files = list(files)
+        self.backend = backend
+        self._lock = threading.RLock()
+        self._file_locks = {}
+        self._tables = {}
+        self._derived = {}
+
+    def _signature(self, filename):
+        return self.backend.signature(filename)
+
+    def _read(self, filename):
+        return self.backend.read_table(filename, exclude=LAZY_TEXT_COLUMNS.get(filename, ()))
+
+    def _entry(self, filename):
+        sig = self._signature(filename)
+        cached = self._tables.get(filename)
+        if cached is not None and cached[0] == sig:
+            metrics.inc("mining_cache_requests_total", cache="datastore", result="hit")
+            return cached
+        metrics.inc("mining_cache_requests_total", cache="datastore", result="miss")
+
+        with self._lock:
+            file_lock = self._file_locks.setdefault(filename, threading.Lock())
+        # Only one thread parses a given file; the others wait and reuse it
+        with file_lock:
+            sig = self._signature(filename)
+            cached = self._tables.get(filename)
+            if cached is not None and cached[0] == sig:
+                return cached
+            entry = (sig, self._read(filename))
+            self._tables[filename] = entry
+            return entry
+
+    def get(self, filename):
+        return self._entry(filename)[1]
+
+    def derive(self, name, filenames, builder, token=None):
+        """Cache builder(*frames) until any of the underlying tables (or token) change"""
+        entries = [self._entry(f) for f in filenames]
+        key = tuple(sig for sig, _ in entries) + (token,)
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == key:
+            metrics.inc("mining_cache_requests_total", cache="derived", result="hit")
+            return cached[1]
+        metrics.inc("mining_cache_requests_total", cache="derived", result="miss")
+        value = builder(*[df for _, df in entries])
+        self._derived[name] = (key, value)
+        return value
+
+    def version(self, *filenames):
+        """Return a hashable token that changes whenever any of the tables change"""
+        return tuple((f, self._signature(f)) for f in (filenames or self.files))
+
+    def invalidate(self, filename=None):
+        with self._lock:
+            if filename is None:
+                self._tables.clear()
+                self._derived.clear()
+            else:
+                self._tables.pop(filename, None)
+
+    def preload(self):
+        for filename in self.files:
+            self.get(filename)
+
+
+store = DataStore([USER_FILE, MINERAL_FILE, DEPOSITS_FILE, COUNTRY_FILE, PROD_TS_FILE, ROLES_FILE, PRICES_FILE, PROD_SERIES_FILE], backend)
+
+# Helper Functions 
+def load_df(filename):
+    """Return the cached DataFrame for a table (shared, do not mutate in place)"""
+    metrics.inc("mining_load_df_calls_total", table=filename)
+    request_tally("load_df_calls")
+    return store.get(filename)
+
+_append_listeners = {}
+
+def on_append(filename):
+    """Register fn(rows, before, after) to patch in-memory state after append_row or
+    bulk_append; rows is a DataFrame of the new records and before/after are the
+    table signatures around the write."""
+    def decorator(fn):
+        _append_listeners.setdefault(filename, []).append(fn)
+        return fn
+    return decorator
+
+def append_row(filename, row, id_col=None):
+    """Insert one record without rewriting the table; allocates row[id_col] when given"""
+    with file_lock(filename):
+        before = backend.signature(filename)
+        row = backend.append(filename, row, id_col)
+        after = backend.signature(filename)
+    store.invalidate(filename)
+    for listener in _append_listeners.get(filename, []):
+        listener(pd.DataFrame([row]), before, after)
+    return row
+
+def bulk_append(filename, chunks, id_col=None, first_id=1):
+    """Append DataFrame chunks in one atomic write; returns the number of rows.
+
+    Blank IDs are assigned from max(next free ID, first_id); pass first_id
+    above every explicit ID in the chunks so the two can't collide.
+    """
+    listeners = _append_listeners.get(filename, [])
+    written = []
+    with file_lock(filename):
+        before = backend.signature(filename)
+        count = backend.bulk_append(filename, chunks, id_col, on_chunk=written.append if listeners else None,
+                                    first_id=first_id)
+        after = backend.signature(filename)
+    store.invalidate(filename)
+    if written:
+        rows = pd.concat(written, ignore_index=True)
+        for listener in listeners:
+            listener(rows, before, after)
+    return count
+
+def save_df(df, filename):
+    """Compacted rewrite of a whole table"""
+    backend.replace(filename, df)
+    store.invalidate(filename)
+
+def delete_rows(filename, **filters):
+    deleted = backend.delete_rows(filename, **filters)
+    store.invalidate(filename)
+    return deleted
+
+def iter_chunks(filename, chunksize=STREAM_CHUNK_ROWS):
+    """Stream a whole table in DataFrame chunks"""
+    return backend.iter_chunks(filename, chunksize)
+
+def count_rows(filename):
+    return backend.count(filename)
+
+def with_text(df, filename, id_col):
+    """Add the table's lazy text columns to df (rows of load_df), read for just those IDs"""
+    lazy = [c for c in LAZY_TEXT_COLUMNS.get(filename, []) if c not in df.columns]
+    if not lazy or df.empty:
+        return df
+    # Only the text for these rows is read; recently shown rows stay in a small LRU
+    ids = tuple(df[id_col].tolist())
+    text = text_cache.get_or_render((filename, repr(store.version(filename)), tuple(lazy), ids),
+                                    lambda: backend.read_text(filename, id_col, lazy, ids))
+    text = text[[id_col] + lazy].astype({id_col: df[id_col].dtype})
+    merged = df.merge(text, on=id_col, how="left")
+    order = [c for c, _ in TABLE_SCHEMAS[filename][2] if c in merged.columns]
+    return merged[order + [c for c in merged.columns if c not in order]]
+
+def find_rows(filename, **filters):
+    """Rows matching column == value filters, pushed down to the backend"""
+    return backend.find_rows(filename, **filters)
+
+def aggregate_sum(filename, by, values):
+    """SUM(values) GROUP BY by, pushed down to the backend"""
+    return backend.aggregate(filename, by, values)
+
+def _user_records(df):
+    if df.empty:
+        return {}
+    return {
+        username: {"password_hash": pwd_hash, "role": int(role), "email": email, "id": user_id}
+        for username, pwd_hash, role, email, user_id in zip(
+            df['Username'].tolist(), df['PasswordHash'].tolist(), df['RoleID'].tolist(),
+            df['Email'].tolist(), df['UserID'].tolist())
+    }
+
+class UserIndex:
+    """In-memory username -> user record map.
+
+    Built once per version of the users table and patched in place when
+    append_row adds a user, so login and registration never scan the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sig = None
+        self._users = None
+
+    def _current(self):
+        sig = backend.signature(USER_FILE)
+        if self._users is None or sig != self._sig:
+            with self._lock:
+                if self._users is None or sig != self._sig:
+                    self._users = _user_records(load_df(USER_FILE))
+                    self._sig = sig
+        return self._users
+
+    def get(self, username):
+        return self._current().get(username)
+
+    def all(self):
+        return dict(self._current())
+
+    def record_append(self, rows, before, after):
+        with self._lock:
+            if self._users is not None and self._sig == before:
+                self._users.update(_user_records(rows))
+                self._sig = after
+
+
+user_index = UserIndex()
+on_append(USER_FILE)(user_index.record_append)
+
+def find_user(username):
+    """Return the user record for a username, or None"""
+    if backend.name == "sqlite":
+        # Indexed point lookup instead of materializing the table
+        return _user_records(find_rows(USER_FILE, Username=username)).get(username)
+    return user_index.get(username)
+
+def load_users():
+    return user_index.all()
+
+# Lookup indexes, rebuilt once per data version
+def _build_index(df, key_col, value_col):
+    if df.empty or key_col not in df.columns or value_col not in df.columns:
+        return {}
+    return dict(zip(df[key_col].tolist(), df[value_col].tolist()))
+
+def role_index():
+    return store.derive("role_names", [ROLES_FILE], lambda df: _build_index(df, "RoleID", "RoleName"))
+
+def country_index():
+    return store.derive("country_names", [COUNTRY_FILE], lambda df: _build_index(df, "CountryID", "CountryName"))
+
+def mineral_index():
+    return store.derive("mineral_names", [MINERAL_FILE], lambda df: _build_index(df, "MineralID", "MineralName"))
+
+def mineral_price_index():
+    return store.derive("mineral_prices", [MINERAL_FILE], lambda df: _build_index(df, "MineralID", "MarketPriceUSD_per_tonne"))
+
+def get_role_name(role_id):
+    return role_index().get(role_id, "Researcher")
+
+def get_country_name(country_id):
+    return country_index().get(country_id, f"Country_{country_id}")
+
+def get_mineral_name(mineral_id):
+    return mineral_index().get(mineral_id, f"Mineral_{mineral_id}")
+
+def _map_names(ids, index, fallback):
+    names = ids.map(index)
+    missing = names.isna()
+    if missing.any():
+        names = names.astype(object)
+        names[missing] = ids[missing].map(fallback)
+    return names
+
+def map_role_names(role_ids):
+    """Vectorized get_role_name for a whole Series"""
+    return _map_names(role_ids, role_index(), lambda _: "Researcher")
+
+def map_country_names(country_ids):
+    """Vectorized get_country_name for a whole Series"""
+    return _map_names(country_ids, country_index(), lambda i: f"Country_{i}")
+
+def map_mineral_names(mineral_ids):
+    """Vectorized get_mineral_name for a whole Series"""
+    return _map_names(mineral_ids, mineral_index(), lambda i: f"Mineral_{i}")
+
+def get_mineral_color(mineral_name):
+    color_map = {
+        "Copper": "orange",
+        "Gold": "gold",
+        "Iron Ore": "darkred",
+        "Diamonds": "lightblue",
+        "Cobalt": "blue",
+        "Platinum": "lightgray",
+        "Phosphates": "green",
+        "Bauxite": "red"
+    }
+    return color_map.get(mineral_name, "purple")
+
+CountryProduction = namedtuple("CountryProduction", ["minerals", "sites", "mineral_counts"])
+
+def _build_country_production(production_df, sites_df, minerals_df):
+    mineral_cols = ["CountryID", "MineralName", "production", "export_value"]
+    site_cols = ["CountryID", "MineralName", "SiteName", "Production_tonnes"]
+
+    # Latest-year production per country, summed by mineral
+    if not production_df.empty:
+        latest_year = production_df.groupby("CountryID")["Year"].transform("max")
+        latest = production_df[production_df["Year"] == latest_year]
+        latest = latest.assign(MineralName=map_mineral_names(latest["MineralID"]))
+        minerals = (latest.groupby(["CountryID", "MineralName"], sort=False)
+                    [["Production_tonnes", "ExportValue_BillionUSD"]].sum().reset_index()
+                    .rename(columns={"Production_tonnes": "production", "ExportValue_BillionUSD": "export_value"}))
+    else:
+        minerals = pd.DataFrame(columns=mineral_cols)
+
+    if not sites_df.empty:
+        sites = sites_df.assign(MineralName=map_mineral_names(sites_df["MineralID"]))[site_cols]
+        # Minerals only known from sites take the first site's production and no export value
+        site_only = sites.drop_duplicates(["CountryID", "MineralName"]).merge(
+            minerals[["CountryID", "MineralName"]], how="left", indicator=True)
+        site_only = site_only[site_only["_merge"] == "left_only"]
+        extra = pd.DataFrame({
+            "CountryID": site_only["CountryID"],
+            "MineralName": site_only["MineralName"],
+            "production": site_only["Production_tonnes"],
+            "export_value": 0,
+        })
+        if not extra.empty:
+            minerals = pd.concat([minerals, extra], ignore_index=True)
+    else:
+        sites = pd.DataFrame(columns=site_cols)
+
+    minerals = minerals[mineral_cols].sort_values("CountryID", kind="stable").reset_index(drop=True)
+    mineral_counts = minerals.groupby("CountryID").size()
+    return CountryProduction(minerals, sites.reset_index(drop=True), mineral_counts)
+
+def country_production_summary():
+    """Latest-year production, export value and sites for every country, computed in one pass"""
+    return store.derive("country_production", [PROD_TS_FILE, DEPOSITS_FILE, MINERAL_FILE], _build_country_production)
+
+def get_country_production_data(country_id):
+    """Get comprehensive production data for a country"""
+    summary = country_production_summary()
+    minerals = summary.minerals[summary.minerals["CountryID"] == country_id]
+    sites = summary.sites[summary.sites["CountryID"] == country_id]
+
+    mineral_production = {
+        name: {"production": production, "export_value": export_value, "sites": []}
+        for name, production, export_value in zip(minerals["MineralName"], minerals["production"], minerals["export_value"])
+    }
+    for name, site_name, production in zip(sites["MineralName"], sites["SiteName"], sites["Production_tonnes"]):
+        mineral_production[name]["sites"].append({
+            "name": site_name,
+            "production": production,
+            "mineral": name
+        })
+    return mineral_production
+
+# Production Rollups
+# rollup name -> grouping columns; each keeps production and export totals
+ROLLUP_KEYS = {
+    "year_mineral": ["Year", "MineralID"],
+    "year_country": ["Year", "CountryID"],
+    "country_mineral": ["CountryID", "MineralID"],
+}
+ROLLUP_VALUES = ["Production_tonnes", "ExportValue_BillionUSD"]
+
+ROLLUP_STATE_FILE = PROD_TS_FILE + ".rollups.json"
+
+class ProductionRollups:
+    """Production/export totals of the production table, grouped by ROLLUP_KEYS.
+
+    Built once per version of the table with the backend's GROUP BY and then
+    patched in place when rows are appended, so charts read a few hundred
+    totals instead of grouping every production row. The totals are also
+    saved to ROLLUP_STATE_FILE with the table signature they match, so other
+    workers pick up a patched copy instead of regrouping the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sig = None
+        self._totals = None  # name -> {key tuple: [production, export]}
+        self._frames = {}
+        self._fingerprint = None
+
+    def _current(self):
+        sig = backend.signature(PROD_TS_FILE)
+        if self._totals is None or sig != self._sig:
+            state = None
+            with self._lock:
+                if self._totals is None or sig != self._sig:
+                    totals = self._load_shared(sig)
+                    if totals is None:
+                        totals = {name: self._group(aggregate_sum(PROD_TS_FILE, keys, ROLLUP_VALUES), keys)
+                                  for name, keys in ROLLUP_KEYS.items()}
+                        state = self._dump(sig, totals)
+                    self._set(sig, totals)
+            if state is not None:
+                self._save_shared(sig, state)
+        return self._totals
+
+    def _set(self, sig, totals):
+        self._totals = totals
+        self._sig = sig
+        self._frames = {}
+        self._fingerprint = None
+
+    @staticmethod
+    def _dump(sig, totals):
+        return json.dumps({"sig": sig, "totals": {name: [list(key) + values for key, values in items.items()]
+                                                 for name, items in totals.items()}})
+
+    @staticmethod
+    def _load_shared(sig):
+        """Totals saved by any worker for exactly this table signature, or None"""
+        if sig is None:
+            return None
+        try:
+            with open(ROLLUP_STATE_FILE) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        saved = state.get("sig")
+        if (tuple(saved) if isinstance(saved, list) else saved) != sig:
+            return None
+        return {name: {tuple(int(k) for k in row[:-2]): row[-2:] for row in rows}
+                for name, rows in state["totals"].items()}
+
+    @staticmethod
+    def _save_shared(sig, state):
+        # Only if the table is still at sig, so a slower writer can't replace newer totals
+        with file_lock(PROD_TS_FILE):
+            if backend.signature(PROD_TS_FILE) != sig:
+                return
+            tmp = ROLLUP_STATE_FILE + f".{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(state)
+            os.replace(tmp, ROLLUP_STATE_FILE)
+
+    @staticmethod
+    def _group(df, keys):
+        if df.empty:
+            return {}
+        df = df.dropna(subset=keys)
+        values = df[ROLLUP_VALUES].fillna(0).to_numpy(dtype="float64").tolist()
+        return dict(zip(df[keys].astype("int64").itertuples(index=False, name=None), values))
+
+    def frame(self, name):
+        """DataFrame of one rollup: the key columns plus ROLLUP_VALUES, sorted by key"""
+        totals = self._current()
+        with self._lock:
+            df = self._frames.get(name)
+            if df is None:
+                keys = ROLLUP_KEYS[name]
+                items = sorted(totals[name].items())
+                df = pd.DataFrame([k + tuple(v) for k, v in items], columns=keys + ROLLUP_VALUES)
+                df = df.astype({k: "int64" for k in keys})
+                self._frames[name] = df
+            return df
+
+    def fingerprint(self):
+        """Content hash of the totals; cache key for charts built from the rollups"""
+        totals = self._current()
+        with self._lock:
+            if self._fingerprint is None:
+                digest = hashlib.sha1()
+                for name in sorted(totals):
+                    digest.update(repr(sorted(totals[name].items())).encode("utf-8"))
+                self._fingerprint = digest.hexdigest()
+            return self._fingerprint
+
+    def record_append(self, rows, before, after):
+        with self._lock:
+            if self._totals is None or self._sig != before:
+                # Another worker may have saved the totals this append started from
+                totals = self._load_shared(before)
+                if totals is None:
+                    return
+                self._set(before, totals)
+            columns = sorted({c for keys in ROLLUP_KEYS.values() for c in keys})
+            if not set(columns).issubset(rows.columns):
+                self._totals = None  # rebuild on next read
+                return
+            numeric = rows.reindex(columns=columns + ROLLUP_VALUES).apply(pd.to_numeric, errors="coerce")
+            for name, keys in ROLLUP_KEYS.items():
+                partial = numeric.groupby(keys)[ROLLUP_VALUES].sum().reset_index()
+                totals = self._totals[name]
+                for key, values in self._group(partial, keys).items():
+                    current = totals.setdefault(key, [0.0, 0.0])
+                    current[0] += values[0]
+                    current[1] += values[1]
+            self._set(after, self._totals)
+            state = self._dump(after, self._totals)
+        self._save_shared(after, state)
+
+
+production_rollups = ProductionRollups()
+on_append(PROD_TS_FILE)(production_rollups.record_append)
+
+# Price History
+class PriceHistory:
+    """Yearly average prices from prices.csv, one sorted series per mineral.
+
+    Built once per version of the prices table. Range and point-in-time
+    lookups are binary searches on the year arrays; returns and volatility
+    are computed column-wise on a year x mineral matrix.
+    """
+
+    def __init__(self, prices_df):
+        cols = ["mineral", "year", "average_price_usd_per_tonne"]
+        if prices_df.empty or not set(cols).issubset(prices_df.columns):
+            prices_df = pd.DataFrame(columns=cols)
+        df = prices_df[cols].dropna()
+        df = df.assign(mineral=df["mineral"].astype(str), year=df["year"].astype("int64"),
+                       price=df["average_price_usd_per_tonne"].astype("float64"))
+        # Several rows for one mineral-year are averaged
+        df = df.groupby(["mineral", "year"], sort=True)["price"].mean().reset_index()
+        self._series = {
+            mineral: (group["year"].to_numpy(), group["price"].to_numpy())
+            for mineral, group in df.groupby("mineral", sort=True)
+        }
+        if df.empty:
+            self.matrix = pd.DataFrame(dtype="float64")
+        else:
+            years = np.arange(df["year"].min(), df["year"].max() + 1)
+            self.matrix = df.pivot(index="year", columns="mineral", values="price").reindex(years)
+
+    def __len__(self):
+        return sum(len(years) for years, _ in self._series.values())
+
+    def minerals(self):
+        return list(self._series)
+
+    def series(self, mineral, start=None, end=None):
+        """Prices of one mineral for start <= year <= end, indexed by year"""
+        years, prices = self._series.get(mineral, (np.array([], dtype="int64"), np.array([])))
+        lo = 0 if start is None else np.searchsorted(years, start, side="left")
+        hi = len(years) if end is None else np.searchsorted(years, end, side="right")
+        return pd.Series(prices[lo:hi], index=pd.Index(years[lo:hi], name="year"), name=mineral)
+
+    def range(self, start=None, end=None, minerals=None):
+        """Year x mineral price matrix restricted to a year range"""
+        matrix = self.matrix.loc[start:end]
+        return matrix[[m for m in minerals if m in matrix.columns]] if minerals is not None else matrix
+
+    def resample(self, years=5, how="mean", start=None, end=None):
+        """Aggregate the yearly prices into buckets of `years` years, labelled by first year"""
+        matrix = self.range(start, end)
+        if matrix.empty:
+            return matrix
+        buckets = matrix.index - (matrix.index - matrix.index[0]) % years
+        return matrix.groupby(buckets).agg(how)
+
+    def returns(self, start=None, end=None):
+        """Year-over-year simple returns; a missing year breaks the chain rather than being filled"""
+        return self.range(start, end).pct_change(fill_method=None)
+
+    def volatility(self, start=None, end=None):
+        """Standard deviation of yearly returns per mineral"""
+        return self.returns(start, end).std()
+
+    def summary(self, start=None, end=None):
+        """One row per mineral: first/last year and price, CAGR and volatility over the range"""
+        matrix = self.range(start, end)
+        cols = ["mineral", "first_year", "last_year", "first_price", "last_price", "cagr", "volatility"]
+        if matrix.empty:
+            return pd.DataFrame(columns=cols)
+        present = matrix.notna().to_numpy()
+        index = matrix.index.to_numpy()
+        first = present.argmax(axis=0)
+        last = len(index) - 1 - present[::-1].argmax(axis=0)
+        values = matrix.to_numpy()
+        cols_idx = np.arange(values.shape[1])
+        first_price, last_price = values[first, cols_idx], values[last, cols_idx]
+        span = (index[last] - index[first]).astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cagr = np.where(span > 0, (last_price / first_price) ** (1 / span) - 1, np.nan)
+        df = pd.DataFrame({
+            "mineral": matrix.columns, "first_year": index[first], "last_year": index[last],
+            "first_price": first_price, "last_price": last_price, "cagr": cagr,
+            "volatility": self.volatility(start, end).to_numpy(),
+        })
+        return df[present.any(axis=0)].reset_index(drop=True)
+
+    def price_at(self, minerals, years):
+        """Point-in-time lookup: latest price at or before each year (NaN if none yet)"""
+        minerals = pd.Series(minerals).astype(str).to_numpy()
+        years = np.asarray(years, dtype="int64")
+        out = np.full(len(years), np.nan)
+        for mineral in np.unique(minerals):
+            series = self._series.get(mineral)
+            if series is None:
+                continue
+            mask = minerals == mineral
+            pos = np.searchsorted(series[0], years[mask], side="right") - 1
+            out[mask] = np.where(pos >= 0, series[1][np.maximum(pos, 0)], np.nan)
+        return out
+
+    def revenue(self, production):
+        """Add Price and Revenue columns to rows with Year, MineralID and Production_tonnes"""
+        names = map_mineral_names(production["MineralID"])
+        price = self.price_at(names, production["Year"])
+        return production.assign(MineralName=names.to_numpy(), Price=price,
+                                 Revenue=production["Production_tonnes"].to_numpy() * price)
+
+
+def price_history():
+    return store.derive("price_history", [PRICES_FILE], PriceHistory)
+
+def revenue_by_year_mineral():
+    """Production revenue per (Year, MineralID) at that year's price, from the rollups"""
+    return store.derive("revenue_by_year_mineral", [PRICES_FILE, MINERAL_FILE],
+                        lambda *_: price_history().revenue(production_rollups.frame("year_mineral")),
+                        token=production_rollups.fingerprint())
+
+# Market Analytics
+MarketAnalytics = namedtuple("MarketAnalytics", ["year", "minerals", "countries", "shares"])
+
+# HHI bands (0-10,000 scale) used by competition authorities
+HHI_BANDS = [(2500, "highly concentrated"), (1500, "moderately concentrated"), (0, "competitive")]
+
+def _build_market_analytics(production_df, minerals_df, countries_df):
+    """Market share, HHI, growth and revenue from one grouping of the production table"""
+    mineral_cols = ["MineralID", "MineralName", "Production_tonnes", "Revenue", "HHI", "TopCountry", "TopShare", "Growth"]
+    country_cols = ["CountryID", "CountryName", "Production_tonnes", "ExportValue_BillionUSD", "Revenue",
+                    "RevenueShare", "ExportShare"]
+    share_cols = ["CountryID", "MineralID", "Production_tonnes", "Share"]
+    keys = ["Year", "CountryID", "MineralID"]
+    values = ["Production_tonnes", "ExportValue_BillionUSD"]
+    if production_df.empty or not set(keys + values).issubset(production_df.columns):
+        return MarketAnalytics(None, pd.DataFrame(columns=mineral_cols), pd.DataFrame(columns=country_cols),
+                               pd.DataFrame(columns=share_cols))
+
+    grouped = production_df.dropna(subset=keys).groupby(keys, sort=True)[values].sum().reset_index()
+    grouped["Revenue"] = grouped["Production_tonnes"] * grouped["MineralID"].map(mineral_price_index()).astype("float64")
+    year = int(grouped["Year"].max())
+    latest = grouped[grouped["Year"] == year]
+
+    # Each country's share of a mineral's output, and the HHI of those shares
+    shares = latest.assign(Share=latest["Production_tonnes"] / latest.groupby("MineralID")["Production_tonnes"].transform("sum"))
+    hhi = (shares["Share"] * 100).pow(2).groupby(shares["MineralID"]).sum()
+    top = shares.sort_values(["MineralID", "Share"], kind="stable").groupby("MineralID").tail(1).set_index("MineralID")
+
+    by_mineral_year = grouped.groupby(["MineralID", "Year"])["Production_tonnes"].sum().unstack("Year")
+    previous = by_mineral_year[year - 1] if year - 1 in by_mineral_year.columns else np.nan
+    growth = by_mineral_year[year] / previous - 1
+
+    minerals = latest.groupby("MineralID")[["Production_tonnes", "Revenue"]].sum()
+    minerals = minerals.assign(HHI=hhi, TopCountry=map_country_names(top["CountryID"]), TopShare=top["Share"],
+                               Growth=growth.replace([np.inf, -np.inf], np.nan)).reset_index()
+    minerals.insert(1, "MineralName", map_mineral_names(minerals["MineralID"]).to_numpy())
+
+    countries = latest.groupby("CountryID")[values + ["Revenue"]].sum()
+    countries = countries.assign(RevenueShare=countries["Revenue"] / countries["Revenue"].sum(),
+                                 ExportShare=countries["ExportValue_BillionUSD"] / countries["ExportValue_BillionUSD"].sum()
+                                 ).reset_index()
+    countries.insert(1, "CountryName", map_country_names(countries["CountryID"]).to_numpy())
+
+    return MarketAnalytics(year, minerals[mineral_cols].sort_values("Revenue", ascending=False, ignore_index=True),
+                           countries[country_cols].sort_values("Revenue", ascending=False, ignore_index=True),
+                           shares[share_cols].reset_index(drop=True))
+
+def market_analytics():
+    """Latest-year market analytics, rebuilt once per data version"""
+    return store.derive("market_analytics", [PROD_TS_FILE, MINERAL_FILE, COUNTRY_FILE], _build_market_analytics)
+
+def hhi_band(hhi):
+    return next(label for floor, label in HHI_BANDS if hhi >= floor)
+
+def market_insights(analytics):
+    """One sentence per mineral, largest revenue first"""
+    insights = []
+    for row in analytics.minerals.to_dict("records"):
+        text = (f"<strong>{html_escape(str(row['MineralName']))}:</strong> {html_escape(str(row['TopCountry']))} "
+                f"supplies {_fmt(row['TopShare'], '.0%')} of recorded {analytics.year} output "
+                f"(HHI {row['HHI']:,.0f}, {hhi_band(row['HHI'])})")
+        if pd.notna(row["Growth"]):
+            text += f"; production {row['Growth']:+.1%} year over year"
+        if pd.notna(row["Revenue"]):
+            text += f"; worth ${row['Revenue'] / 1e9:,.2f}B at current prices"
+        insights.append(text)
+    return insights
+
+# Render Cache
+MAP_CACHE_SIZE = int(os.environ.get("MAP_CACHE_SIZE", "16"))
+MAP_CACHE_DIR = os.environ.get("MAP_CACHE_DIR")  # unset = memory only
+
+class RenderCache:
+    """LRU cache of rendered HTML fragments, optionally persisted to disk.
+
+    Keys should include a data fingerprint so entries are never stale; the
+    disk copy lets a restarted worker skip the first render. The directory
+    keeps the maxsize most recently used files, so old fingerprints are
+    removed as the data changes.
+    """
+
+    def __init__(self, maxsize=16, directory=None, suffix=".html", name="render"):
+        self.name = name
+        self.maxsize = maxsize
+        self.directory = directory
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + self.suffix)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    value = f.read()
+                os.utime(path)  # mark as recently used for _prune
+            except OSError:
+                return None
+            self._remember(key, value)
+            return value
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp, path)
+            self._prune()
+
+    def _prune(self):
+        """Delete all but the maxsize most recently used files in the directory"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.stat(path).st_mtime_ns, path))
+                except OSError:
+                    pass  # removed by another worker
+        for _, path in sorted(entries, reverse=True)[self.maxsize:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        metrics.inc("mining_cache_requests_total", cache=self.name, result="miss" if value is None else "hit")
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+map_cache = RenderCache(MAP_CACHE_SIZE, MAP_CACHE_DIR, name="map")
+
+# Lazy text columns (see with_text) for recently shown sets of rows, memory only
+TEXT_CACHE_SIZE = int(os.environ.get("MINING_TEXT_CACHE_SIZE", "32"))
+text_cache = RenderCache(TEXT_CACHE_SIZE, name="text")
+
+def table_fingerprint(*filenames):
+    """Content hash of one or more tables, recomputed only when they change"""
+    def build(*frames):
+        digest = hashlib.sha1()
+        for df in frames:
+            digest.update(repr(list(df.columns)).encode("utf-8"))
+            if not df.empty:
+                digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()
+    return store.derive("fingerprint:" + ",".join(filenames), list(filenames), build)
+
+def map_data_fingerprint():
+    # SQLite's per-table version counters persist, so they can key the disk cache without hashing rows
+    if backend.name == "sqlite":
+        return repr(store.version(DEPOSITS_FILE, MINERAL_FILE, COUNTRY_FILE))
+    return table_fingerprint(DEPOSITS_FILE, MINERAL_FILE, COUNTRY_FILE)
+
+# Map Rendering
+@timed_render("folium")
+def render_dashboard_map():
+    sites_df = load_df(DEPOSITS_FILE)
+    africa_map = folium.Map(location=[-8, 28], zoom_start=4)
+    mineral_names = map_mineral_names(sites_df['MineralID'])
+    country_names = map_country_names(sites_df['CountryID'])
+    
+    for idx, site in sites_df.iterrows():
+        mineral_name = mineral_names[idx]
+        country_name = country_names[idx]
+        color = get_mineral_color(mineral_name)
+        
+        popup_text = f"""
+        <div style='min-width: 250px;'>
+            <h4 style='margin: 0; color: #333;'>{site['SiteName']}</h4>
+            <hr style='margin: 5px 0;'>
+            <p style='margin: 2px 0;'><strong>Country:</strong> {country_name}</p>
+            <p style='margin: 2px 0;'><strong>Mineral:</strong> {mineral_name}</p>
+            <p style='margin: 2px 0;'><strong>Annual Production:</strong> {site['Production_tonnes']:,.0f} tonnes</p>
+        </div>
+        """
+        
+        folium.Marker(
+            [site['Latitude'], site['Longitude']],
+            popup=folium.Popup(popup_text, max_width=300),
+            tooltip=f"{site['SiteName']} - {mineral_name}",
+            icon=folium.Icon(color=color, icon='info-sign')
+        ).add_to(africa_map)
+    
+    return africa_map._repr_html_()
+
+def site_popup_html(site, mineral_name, country_name, color, price):
+    price = f"{price:,.2f}" if isinstance(price, (int, float)) else price
+    return f"""
+    <div style='min-width: 280px;'>
+        <h4 style='color: #2c3e50; margin-bottom: 10px;'>{site['SiteName']}</h4>
+        <div style='border-left: 4px solid {color}; padding-left: 10px;'>
+            <p style='margin: 5px 0;'><strong>Country:</strong> {country_name}</p>
+            <p style='margin: 5px 0;'><strong>Mineral:</strong> {mineral_name}</p>
+            <p style='margin: 5px 0;'><strong>Annual Production:</strong> {site['Production_tonnes']:,.0f} tonnes</p>
+            <p style='margin: 5px 0;'><strong>Market Price:</strong> ${price}/tonne</p>
+            <p style='margin: 5px 0;'><strong>Coordinates:</strong> {site['Latitude']:.4f}, {site['Longitude']:.4f}</p>
+        </div>
+    </div>
+    """
+
+@timed_render("folium")
+def render_site_map():
+    sites_df = load_df(DEPOSITS_FILE)
+    m = folium.Map(location=[-8, 28], zoom_start=4, tiles='OpenStreetMap')
+    mineral_names = map_mineral_names(sites_df['MineralID'])
+    country_names = map_country_names(sites_df['CountryID'])
+    prices = mineral_price_index()
+    
+    for idx, site in sites_df.iterrows():
+        mineral_name = mineral_names[idx]
+        country_name = country_names[idx]
+        color = get_mineral_color(mineral_name)
+        price = prices.get(site['MineralID'], "N/A")
+        popup_text = site_popup_html(site, mineral_name, country_name, color, price)
+        
+        folium.Marker(
+            [site['Latitude'], site['Longitude']],
+            popup=folium.Popup(popup_text, max_width=350),
+            tooltip=f"{site['SiteName']} - {mineral_name}",
+            icon=folium.Icon(color=color, icon='info-sign')
+        ).add_to(m)
+    
+    return m._repr_html_()
+
+# Spatial Index
+EARTH_RADIUS_KM = 6371.0088
+SPATIAL_CELL_DEG = 1.0
+
+def haversine_km(lat, lon, lats, lons):
+    lat1, lon1, lat2, lon2 = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+class SpatialIndex:
+    """Uniform lat/lon grid over site coordinates.
+
+    Points are sorted by cell key (row * ncols + col), so every row of a query
+    window is one contiguous slice found with searchsorted. Query methods return
+    positional row numbers into site_points().
+    """
+
+    def __init__(self, lats, lons, mineral_ids=None, country_ids=None, cell=SPATIAL_CELL_DEG):
+        self.cell = cell
+        self.nrows = int(np.ceil(180 / cell)) + 1
+        self.ncols = int(np.ceil(360 / cell)) + 1
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        keys = self._row(lats) * self.ncols + self._col(lons)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.lats = lats[self.order]
+        self.lons = lons[self.order]
+        self.mineral_ids = None if mineral_ids is None else np.asarray(mineral_ids)[self.order]
+        self.country_ids = None if country_ids is None else np.asarray(country_ids)[self.order]
+
+    def __len__(self):
+        return len(self.order)
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell), 0, self.nrows - 1).astype(np.int64)
+
+    def _col(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180) / self.cell), 0, self.ncols - 1).astype(np.int64)
+
+    def _window(self, west, south, east, north):
+        """Sorted positions of every point in the grid cells covering a non-wrapping box"""
+        r0, r1 = int(self._row(south)), int(self._row(north))
+        c0, c1 = int(self._col(west)), int(self._col(east))
+        rows = np.arange(r0, r1 + 1)
+        starts = np.searchsorted(self.keys, rows * self.ncols + c0, side="left")
+        stops = np.searchsorted(self.keys, rows * self.ncols + c1, side="right")
+        spans = [np.arange(a, b) for a, b in zip(starts, stops) if b > a]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def _candidates(self, bbox):
+        west, south, east, north = bbox
+        if west <= east:
+            pos = self._window(west, south, east, north)
+        else:
+            pos = np.concatenate([self._window(west, south, 180, north), self._window(-180, south, east, north)])
+        return pos[_in_bbox(self.lats[pos], self.lons[pos], bbox)]
+
+    def _filter(self, pos, mineral_id=None, country_id=None):
+        if mineral_id is not None and self.mineral_ids is not None:
+            pos = pos[self.mineral_ids[pos] == mineral_id]
+        if country_id is not None and self.country_ids is not None:
+            pos = pos[self.country_ids[pos] == country_id]
+        return pos
+
+    def bbox(self, bbox, mineral_id=None, country_id=None, limit=None):
+        pos = self._filter(self._candidates(bbox), mineral_id, country_id)
+        if limit is not None:
+            pos = pos[:limit]
+        return self.order[pos]
+
+    def _radius_bbox(self, lat, lon, radius_km):
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        if south == -90.0 or north == 90.0 or dlat >= 90:
+            return -180.0, south, 180.0, north  # box reaches a pole
+        dlon = np.degrees(radius_km / (EARTH_RADIUS_KM * np.cos(np.radians(max(abs(south), abs(north))))))
+        if dlon >= 180:
+            return -180.0, south, 180.0, north
+        west, east = lon - dlon, lon + dlon
+        west = west + 360 if west < -180 else west
+        east = east - 360 if east > 180 else east
+        return west, south, east, north
+
+    def within(self, lat, lon, radius_km, mineral_id=None, country_id=None):
+        """(rows, distances) of every point within radius_km, nearest first"""
+        pos = self._filter(self._candidates(self._radius_bbox(lat, lon, radius_km)), mineral_id, country_id)
+        dist = haversine_km(lat, lon, self.lats[pos], self.lons[pos])
+        keep = dist <= radius_km
+        pos, dist = pos[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return self.order[pos[order]], dist[order]
+
+    def nearest(self, lat, lon, k=5, mineral_id=None, country_id=None):
+        """(rows, distances) of the k nearest points, growing the search ring until k are found"""
+        radius = SPATIAL_CELL_DEG * 111.0
+        max_radius = np.pi * EARTH_RADIUS_KM
+        while True:
+            rows, dist = self.within(lat, lon, radius, mineral_id, country_id)
+            if len(rows) >= k or radius >= max_radius:
+                return rows[:k], dist[:k]
+            radius = min(radius * 2, max_radius)
+
+
+def spatial_index():
+    """Grid index over site_points(), rebuilt when sites/minerals/countries change"""
+    def build(*_):
+        points = site_points()
+        return SpatialIndex(points["Latitude"], points["Longitude"], points["MineralID"], points["CountryID"])
+    return store.derive("spatial_index", [DEPOSITS_FILE, MINERAL_FILE, COUNTRY_FILE], build)
+
+def site_records(rows, distances=None):
+    """JSON-ready site dicts for positional rows of site_points(), keyed like /api/v1/sites"""
+    points = site_points().iloc[rows]
+    records = []
+    for i, site in enumerate(points.itertuples(index=False)):
+        record = {
+            "SiteID": int(site.SiteID),
+            "SiteName": site.SiteName,
+            "CountryID": int(site.CountryID),
+            "CountryName": site.CountryName,
+            "MineralID": int(site.MineralID),
+            "MineralName": site.MineralName,
+            "Latitude": float(site.Latitude),
+            "Longitude": float(site.Longitude),
+            "Production_tonnes": float(site.Production_tonnes),
+        }
+        if distances is not None:
+            record["Distance_km"] = round(float(distances[i]), 3)
+        records.append(record)
+    return records
+
+# Scalable map: the page ships an empty map and fetches clustered GeoJSON for
+# the visible bounding box; popups are loaded on click.
+MAP_MARKER_LIMIT = int(os.environ.get("MAP_MARKER_LIMIT", "1000"))
+CLUSTER_MAX_ZOOM = 12        # at or above this zoom every site is drawn individually
+CLUSTER_CELLS_PER_TILE = 4   # grid cells per 256px map tile
+MAX_FEATURES = 5000
+
+LAZY_MAP_SCRIPT = """
+(function() {
+    var map = __MAP__;
+    var layer = L.layerGroup().addTo(map);
+    var pending = null;
+    function load() {
+        var b = map.getBounds();
+        var url = '__SITES_API__/geojson?bbox=' + [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].join(',')
+                + '&zoom=' + map.getZoom();
+        if (pending) { pending.abort(); }
+        pending = new AbortController();
+        fetch(url, {signal: pending.signal, credentials: 'same-origin'})
+            .then(function(r) { return r.json(); })
+            .then(function(data) {
+                layer.clearLayers();
+                data.features.forEach(function(f) {
+                    var p = f.properties, ll = [f.geometry.coordinates[1], f.geometry.coordinates[0]];
+                    if (p.cluster) {
+                        var size = Math.round(26 + Math.min(30, Math.log(p.point_count) * 5));
+                        L.marker(ll, {icon: L.divIcon({
+                            className: '',
+                            iconSize: [size, size],
+                            html: '<div style="width:' + size + 'px;height:' + size + 'px;line-height:' + size +
+                                  'px;border-radius:50%;background:rgba(52,152,219,.8);color:#fff;text-align:center;' +
+                                  'font:bold 12px sans-serif;">' + p.point_count + '</div>'
+                        })}).on('click', function() {
+                            var bb = p.bbox;
+                            if (bb[0] === bb[2] && bb[1] === bb[3]) { map.setView(ll, map.getZoom() + 2); }
+                            else { map.fitBounds([[bb[1], bb[0]], [bb[3], bb[2]]]); }
+                        }).addTo(layer);
+                    } else {
+                        var marker = L.circleMarker(ll, {radius: 7, color: p.color, fillColor: p.color, fillOpacity: 0.8})
+                            .bindTooltip(p.name + ' - ' + p.mineral);
+                        marker.on('click', function() {
+                            fetch('__SITES_API__/' + p.id + '/popup', {credentials: 'same-origin'})
+                                .then(function(r) { return r.text(); })
+                                .then(function(html) { marker.bindPopup(html, {maxWidth: 350}).openPopup(); });
+                        });
+                        marker.addTo(layer);
+                    }
+                });
+            })
+            .catch(function() {});
+    }
+    map.on('moveend', load);
+    load();
+})();
+"""
+
+@timed_render("folium")
+def render_lazy_site_map():
+    m = folium.Map(location=[-8, 28], zoom_start=4, tiles='OpenStreetMap')
+    m.get_root().script.add_child(folium.Element(LAZY_MAP_SCRIPT.replace("__MAP__", m.get_name()).replace("__SITES_API__", f"/api/{API_VERSION}/sites")))
+    return m._repr_html_()
+
+def _build_site_points(sites_df, minerals_df, countries_df):
+    if sites_df.empty:
+        return pd.DataFrame(columns=["SiteID", "SiteName", "CountryID", "MineralID", "Latitude", "Longitude",
+                                     "Production_tonnes", "MineralName", "CountryName", "Color"])
+    points = sites_df.dropna(subset=["Latitude", "Longitude"]).reset_index(drop=True)
+    mineral_names = map_mineral_names(points["MineralID"])
+    return points.assign(
+        MineralName=mineral_names,
+        CountryName=map_country_names(points["CountryID"]),
+        Color=mineral_names.map(get_mineral_color),
+    )
+
+def site_points():
+    """Sites with resolved names and marker colours, one row per plottable site"""
+    return store.derive("site_points", [DEPOSITS_FILE, MINERAL_FILE, COUNTRY_FILE], _build_site_points)
+
+def _cluster_points(points, zoom):
+    cell = 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+    keys = [np.floor(points["Latitude"].to_numpy() / cell), np.floor(points["Longitude"].to_numpy() / cell)]
+    grouped = points.assign(Row=np.arange(len(points))).groupby(keys, sort=False)
+    return grouped.agg(
+        Latitude=("Latitude", "mean"), Longitude=("Longitude", "mean"),
+        South=("Latitude", "min"), North=("Latitude", "max"),
+        West=("Longitude", "min"), East=("Longitude", "max"),
+        Count=("SiteID", "size"), First=("Row", "first"),
+    ).reset_index(drop=True)
+
+def site_clusters(zoom):
+    """Grid clusters of all sites for one zoom level, cached per data version"""
+    return store.derive(f"site_clusters:{zoom}", [DEPOSITS_FILE, MINERAL_FILE, COUNTRY_FILE],
+                        lambda *_: _cluster_points(site_points(), zoom))
+
+def _in_bbox(lat, lon, bbox):
+    west, south, east, north = bbox
+    in_lat = (lat >= south) & (lat <= north)
+    if west <= east:
+        return in_lat & (lon >= west) & (lon <= east)
+    return in_lat & ((lon >= west) | (lon <= east))  # bbox crosses the antimeridian
+
+def parse_bbox(value):
+    """'west,south,east,north' -> tuple of floats, or None if malformed"""
+    try:
+        west, south, east, north = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        return None
+    if not (-90 <= south <= north <= 90):
+        return None
+    # Leaflet reports longitudes past +-180 after panning round the globe
+    west = (west + 180) % 360 - 180 if abs(west) > 180 else west
+    east = (east + 180) % 360 - 180 if abs(east) > 180 else east
+    return west, south, east, north
+
+def site_feature(site):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(site["Longitude"]), float(site["Latitude"])]},
+        "properties": {
+            "id": int(site["SiteID"]),
+            "name": site["SiteName"],
+            "mineral": site["MineralName"],
+            "country": site["CountryName"],
+            "color": site["Color"],
+        },
+    }
+
+def site_features_in_bbox(bbox, zoom):
+    points = site_points()
+    if zoom >= CLUSTER_MAX_ZOOM:
+        rows = spatial_index().bbox(bbox, limit=MAX_FEATURES)
+        return [site_feature(site) for site in points.iloc[rows].to_dict("records")]
+
+    clusters = site_clusters(zoom)
+    clusters = clusters[_in_bbox(clusters["Latitude"].to_numpy(), clusters["Longitude"].to_numpy(), bbox)]
+    features = []
+    for cluster in clusters.head(MAX_FEATURES).itertuples(index=False):
+        if cluster.Count == 1:
+            features.append(site_feature(points.iloc[cluster.First]))
+        else:
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [cluster.Longitude, cluster.Latitude]},
+                "properties": {
+                    "cluster": True,
+                    "point_count": int(cluster.Count),
+                    "bbox": [cluster.West, cluster.South, cluster.East, cluster.North],
+                },
+            })
+    return features
+
+# Chart Rendering
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "32"))
+chart_cache = RenderCache(CHART_CACHE_SIZE, name="chart")
+
+def cached_chart(name, filenames, build_figure):
+    """Figure HTML (div + figure JSON, without plotly.js) cached per content version of its tables.
+
+    Charts over the production table are built from its rollups, so they are
+    keyed on the rollups' fingerprint rather than a hash of every raw row.
+    """
+    tables = [f for f in filenames if f != PROD_TS_FILE]
+    key = (name, table_fingerprint(*tables) if tables else None,
+           production_rollups.fingerprint() if PROD_TS_FILE in filenames else None)
+
+    def render():
+        with metrics.timer("mining_render_seconds", kind="plotly", view=name):
+            return build_figure().to_html(full_html=False, include_plotlyjs=False)
+    return chart_cache.get_or_render(key, render)
+
+_plotly_asset = None
+
+def plotly_asset():
+    """(fingerprint, js bytes, gzipped js bytes) for the plotly.js bundled with the plotly package"""
+    global _plotly_asset
+    if _plotly_asset is None:
+        from plotly.offline import get_plotlyjs
+        js = get_plotlyjs().encode("utf-8")
+        _plotly_asset = (hashlib.sha1(js).hexdigest()[:12], js, gzip.compress(js, 6))
+    return _plotly_asset
+
+def plotly_script_tag():
+    return f'<script src="{url_for("plotly_js", digest=plotly_asset()[0])}"></script>'
+
+def build_production_trend_figure():
+    yearly_production = production_rollups.frame("year_mineral")
+    yearly_production = yearly_production.assign(MineralName=map_mineral_names(yearly_production['MineralID']))
+    yearly_production = yearly_production.groupby(['Year', 'MineralName'])['Production_tonnes'].sum().reset_index()
+    return px.line(yearly_production, x='Year', y='Production_tonnes', color='MineralName',
+                   title='Mineral Production Trends Over Time (2020-2023)',
+                   labels={'Production_tonnes': 'Production (tonnes)', 'Year': 'Year'})
+
+def build_export_figure():
+    export_by_country = production_rollups.frame("year_country").groupby('CountryID')['ExportValue_BillionUSD'].sum().reset_index()
+    export_by_country['CountryName'] = map_country_names(export_by_country['CountryID'])
+    return px.bar(export_by_country, x='CountryName', y='ExportValue_BillionUSD',
+                  title='Total Export Values by Country (2020-2023)',
+                  labels={'ExportValue_BillionUSD': 'Export Value (Billion USD)'})
+
+def build_price_figure():
+    return px.bar(load_df(MINERAL_FILE), x='MineralName', y='MarketPriceUSD_per_tonne',
+                  title='Mineral Market Prices (USD per tonne)',
+                  color='MineralName',
+                  labels={'MarketPriceUSD_per_tonne': 'Price (USD/tonne)'})
+
+def build_dashboard_price_figure():
+    return px.bar(load_df(MINERAL_FILE), x='MineralName', y='MarketPriceUSD_per_tonne',
+                  title='Mineral Market Prices', color='MineralName',
+                  labels={'MarketPriceUSD_per_tonne': 'Price per tonne (USD)', 'MineralName': 'Mineral'})
+
+# Streaming
+def iter_row_chunks(df, size=STREAM_CHUNK_ROWS):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+# Export name -> (table, columns left out, admin only)
+EXPORTS = {
+    "production": (PROD_TS_FILE, [], False),
+    "sites": (DEPOSITS_FILE, [], False),
+    "users": (USER_FILE, ["PasswordHash"], True),
+}
+
+def stream_csv(chunks):
+    header = True
+    for chunk in chunks:
+        buf = io.StringIO()
+        chunk.to_csv(buf, index=False, header=header)
+        header = False
+        yield buf.getvalue()
+
+def stream_ndjson(chunks):
+    for chunk in chunks:
+        records = df_records(chunk)
+        if records:
+            yield "\n".join(json.dumps(record, default=str) for record in records) + "\n"
+
+# Bulk Import
+IMPORT_CHUNK_ROWS = 50000
+IMPORT_MAX_ERRORS = 20
+
+# keys: column -> (table, column) it must reference; ranges: column -> (min, max)
+ImportSpec = namedtuple("ImportSpec", "filename id_col numeric keys ranges")
+ImportResult = namedtuple("ImportResult", "rows errors error_count")
+
+IMPORT_SPECS = {
+    "production_stats": ImportSpec(
+        PROD_TS_FILE, "StatID", ["Year", "CountryID", "MineralID", "Production_tonnes", "ExportValue_BillionUSD"],
+        {"CountryID": (COUNTRY_FILE, "CountryID"), "MineralID": (MINERAL_FILE, "MineralID")}, {}),
+    "sites": ImportSpec(
+        DEPOSITS_FILE, "SiteID", ["CountryID", "MineralID", "Latitude", "Longitude", "Production_tonnes"],
+        {"CountryID": (COUNTRY_FILE, "CountryID"), "MineralID": (MINERAL_FILE, "MineralID")},
+        {"Latitude": (-90, 90), "Longitude": (-180, 180)}),
+    "prices": ImportSpec(
+        PRICES_FILE, None, ["year", "average_price_usd_per_tonne"],
+        {"mineral": (MINERAL_FILE, "MineralName")}, {}),
+    "production_timeseries": ImportSpec(
+        PROD_SERIES_FILE, None, ["year", "production_tonnes", "export_tonnes"],
+        {"country": (COUNTRY_FILE, "CountryName"), "mineral": (MINERAL_FILE, "MineralName")}, {}),
+}
+
+def _allowed_keys(spec):
+    allowed = {}
+    for col, (filename, ref_col) in spec.keys.items():
+        ref = load_df(filename)
+        values = ref[ref_col].dropna() if ref_col in ref.columns else pd.Series(dtype=object)
+        allowed[col] = pd.to_numeric(values).unique() if col in spec.numeric else values.astype(str).unique()
+    return allowed
+
+def _import_dtypes(spec):
+    return {c: {"INTEGER": "Int64", "REAL": "float64"}.get(t, object) for c, t in TABLE_SCHEMAS[spec.filename][2]}
+
+def _validate_chunk(chunk, spec, allowed, seen_ids, first_line):
+    """Coerce one chunk to the table's types; returns (clean chunk, [(line, message)])"""
+    errors = []
+    lines = np.arange(first_line, first_line + len(chunk))
+
+    def fail(mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        errors.extend((int(line), message) for line in lines[mask])
+        return mask
+
+    dtypes = _import_dtypes(spec)
+    bad = np.zeros(len(chunk), dtype=bool)
+    chunk = chunk.copy()
+    for col in spec.numeric:
+        if col not in chunk.columns:
+            continue
+        values = pd.to_numeric(chunk[col], errors="coerce")
+        bad |= fail(values.isna() & chunk[col].notna(), f"{col} is not a number")
+        if dtypes[col] == "Int64":
+            bad |= fail(values.notna() & (values % 1 != 0), f"{col} is not a whole number")
+        chunk[col] = values
+    for col, (low, high) in spec.ranges.items():
+        bad |= fail(chunk[col].notna() & ~chunk[col].between(low, high), f"{col} outside {low}..{high}")
+    for col, values in allowed.items():
+        missing = chunk[col].isna()
+        bad |= fail(missing, f"{col} is required")
+        bad |= fail(~missing & ~chunk[col].isin(values), f"unknown {col}")
+
+    if spec.id_col is not None and spec.id_col in chunk.columns:
+        ids = pd.to_numeric(chunk[spec.id_col], errors="coerce")
+        given = chunk[spec.id_col].notna()
+        bad |= fail(given & (ids.isna() | (ids % 1 != 0)), f"{spec.id_col} is not a whole number")
+        bad |= fail(given & ids.notna() & (ids.duplicated(keep="first") | ids.isin(seen_ids)),
+                    f"duplicate {spec.id_col}")
+        seen_ids.update(ids.dropna().astype("int64").tolist())
+        chunk[spec.id_col] = ids
+    return chunk[~bad], errors
+
+def import_rows(dataset, source, chunksize=IMPORT_CHUNK_ROWS):
+    """Bulk-load a CSV (path or file object) into one of the IMPORT_SPECS tables.
+
+    The upload is validated chunk by chunk and staged to a temp file; only if
+    every row passes is it appended to the table in a single atomic write.
+    """
+    spec = IMPORT_SPECS[dataset]
+    columns = [c for c, _ in TABLE_SCHEMAS[spec.filename][2]]
+    required = [c for c in columns if c != spec.id_col]
+    allowed = _allowed_keys(spec)
+    seen_ids = set()
+    if spec.id_col is not None:
+        existing = load_df(spec.filename)
+        if spec.id_col in existing.columns:
+            seen_ids.update(pd.to_numeric(existing[spec.id_col], errors="coerce").dropna().astype("int64").tolist())
+
+    errors, error_count, staged_rows, max_given = [], 0, 0, 0
+    with tempfile.TemporaryFile("w+", newline="", encoding="utf-8") as staged:
+        try:
+            reader = pd.read_csv(source, chunksize=chunksize, dtype=str, skipinitialspace=True)
+            for n, chunk in enumerate(reader):
+                if n == 0:
+                    missing = [c for c in required if c not in chunk.columns]
+                    if missing:
+                        return ImportResult(0, [(1, "missing columns: " + ", ".join(missing))], 1)
+                clean, chunk_errors = _validate_chunk(chunk, spec, allowed, seen_ids, n * chunksize + 2)
+                error_count += len(chunk_errors)
+                errors.extend(chunk_errors[:IMPORT_MAX_ERRORS - len(errors)])
+                if not error_count:
+                    clean = clean.reindex(columns=columns).astype(_import_dtypes(spec))
+                    clean.to_csv(staged, index=False, header=(n == 0))
+                    staged_rows += len(clean)
+                    if spec.id_col is not None and clean[spec.id_col].notna().any():
+                        max_given = max(max_given, int(clean[spec.id_col].max()))
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            return ImportResult(0, [(0, f"could not parse CSV: {e}")], 1)
+
+        if error_count:
+            return ImportResult(0, sorted(errors), error_count)
+        if not staged_rows:
+            return ImportResult(0, [], 0)
+        staged.seek(0)
+        chunks = pd.read_csv(staged, chunksize=chunksize, dtype=_import_dtypes(spec))
+        # Blank IDs start after every explicit ID in the upload, including later chunks
+        written = bulk_append(spec.filename, chunks, spec.id_col, first_id=max_given + 1)
+    return ImportResult(written, [], 0)
+
+# Pagination
+PAGE_SIZE = 50
+PAGE_SIZE_MAX = 500
+
+COUNTRY_SORTS = {"CountryID": "ID", "CountryName": "Name", "GDP_BillionUSD": "GDP", "MiningRevenue_BillionUSD": "Mining Revenue"}
+COUNTRY_FILTERS = {"CountryName": ("text", "Country name")}
+MINERAL_SORTS = {"MineralID": "ID", "MineralName": "Name", "MarketPriceUSD_per_tonne": "Price"}
+MINERAL_FILTERS = {"MineralName": ("text", "Mineral name")}
+USER_SORTS = {"UserID": "ID", "Username": "Username", "Email": "Email", "RoleID": "Role"}
+USER_FILTERS = {"Username": ("text", "Username"), "Email": ("text", "Email"), "RoleID": ("int", "Role ID")}
+PRODUCTION_SORTS = {"StatID": "ID", "Year": "Year", "Production_tonnes": "Production", "ExportValue_BillionUSD": "Export value"}
+PRODUCTION_FILTERS = {"CountryID": ("int", "Country ID"), "MineralID": ("int", "Mineral ID"), "Year": ("int", "Year")}
+
+ListQuery = namedtuple("ListQuery", ["sort", "descending", "filters", "after", "limit"])
+Page = namedtuple("Page", ["rows", "total", "next_cursor"])
+
+def parse_list_query(sortable, filterable, default_sort):
+    """Read sort/order/filter/cursor/per_page query parameters for a list page.
+
+    filterable maps column -> (kind, label) where kind is "text" (case-insensitive
+    substring) or "int" (equality).
+    """
+    sort = request.args.get("sort", default_sort)
+    if sort not in sortable:
+        sort = default_sort
+    filters = {}
+    for col, (kind, _) in filterable.items():
+        value = request.args.get(col, "").strip()
+        if value:
+            try:
+                filters[col] = int(value) if kind == "int" else value.lower()
+            except ValueError:
+                pass
+    try:
+        limit = min(max(int(request.args.get("per_page", PAGE_SIZE)), 1), PAGE_SIZE_MAX)
+    except ValueError:
+        limit = PAGE_SIZE
+    return ListQuery(sort, request.args.get("order") == "desc", filters, request.args.get("after"), limit)
+
+def encode_cursor(value, row_id):
+    raw = json.dumps([value, row_id], default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    """(value, row_id) from an after= cursor; None unless the value is a scalar and
+    the ID an integer, both bindable as SQL parameters"""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(value, (str, int, float, type(None))) or type(row_id) is not int:
+        return None
+    if any(isinstance(v, int) and not -2**63 <= v < 2**63 for v in (value, row_id)):
+        return None
+    return value, row_id
+
+SortOrder = namedtuple("SortOrder", ["positions", "values", "ids", "valid"])
+
+def sorted_positions(filename, column, id_col, descending=False):
+    """A table's row positions ordered by (column, id_col), nulls last, with the sort
+    values and IDs in that order and the number of non-null values; cached per data version"""
+    def build(df):
+        if df.empty or column not in df.columns:
+            positions = np.arange(len(df))
+            return SortOrder(positions, positions, positions, len(df))
+        keys = [column] if column == id_col else [column, id_col]
+        ordered = df[keys].reset_index(drop=True).sort_values(
+            keys, ascending=not descending, kind="stable", na_position="last")
+        return SortOrder(ordered.index.to_numpy(), ordered[column].to_numpy(dtype=object),
+                         ordered[id_col].to_numpy(), int(ordered[column].notna().sum()))
+    return store.derive(f"sorted:{filename}:{column}:{id_col}:{descending}", [filename], build)
+
+def seek_after(order, value, row_id, descending=False):
+    """Index of the first row after the cursor row (value, row_id) in an ordered SortOrder.
+
+    Binary search on (value, id), so ties on the sort value and deleted cursor
+    rows resume in the right place. value None means the cursor row's value
+    was null (those rows sort last, by ID).
+    """
+    values, ids, valid = order.values, order.ids, order.valid
+    if value is None:
+        null_ids = ids[valid:]
+        if descending:
+            return valid + len(null_ids) - int(np.searchsorted(null_ids[::-1], row_id, "left"))
+        return valid + int(np.searchsorted(null_ids, row_id, "right"))
+    values, ids = values[:valid], ids[:valid]
+    if descending:
+        values, ids = values[::-1], ids[::-1]
+    lo = int(np.searchsorted(values, value, "left"))
+    hi = int(np.searchsorted(values, value, "right"))
+    if descending:
+        # Count the rows at or before the cursor in ascending order, then flip
+        return valid - (lo + int(np.searchsorted(ids[lo:hi], row_id, "left")))
+    return lo + int(np.searchsorted(ids[lo:hi], row_id, "right"))
+
+def lowercase_column(filename, column):
+    """Lowercased string array of a text column, cached for substring filters"""
+    return store.derive(f"lower:{filename}:{column}", [filename],
+                        lambda df: df[column].astype("string").str.lower().fillna("").to_numpy(dtype=str))
+
+def paginate(filename, id_col, query):
+    """Keyset pagination over a cached sort order with column filters applied"""
+    if backend.name == "sqlite":
+        return backend.page(filename, id_col, query)
+    df = load_df(filename)
+    if df.empty:
+        return Page(df, 0, None)
+    order = sorted_positions(filename, query.sort, id_col, query.descending)
+
+    if query.filters:
+        mask = np.ones(len(df), dtype=bool)
+        for col, value in query.filters.items():
+            if isinstance(value, int):
+                mask &= (df[col] == value).to_numpy()
+            else:
+                mask &= np.char.find(lowercase_column(filename, col), value) >= 0
+        keep = mask[order.positions]
+        order = SortOrder(order.positions[keep], order.values[keep], order.ids[keep],
+                          int(keep[:order.valid].sum()))
+    positions = order.positions
+    total = len(positions)
+
+    start = 0
+    cursor = decode_cursor(query.after) if query.after else None
+    if cursor is not None:
+        value, row_id = cursor
+        try:
+            start = seek_after(order, value, row_id, query.descending)
+        except TypeError:
+            start = 0  # cursor from another sort column; start over
 
-    # Comprehensive African countries data: Added MiningContribution_GDP column
-    countries_df = pd.read_csv(COUNTRY_FILE) if os.path.exists(COUNTRY_FILE) else pd.DataFrame()
-    if countries_df.empty:
-        african_countries = [
-            [1, "DR Congo", 58.0, 8.5, "World's largest cobalt producer, major copper and diamond producer", 95.0, 15.2],
-            [2, "South Africa", 380.0, 25.3, "World's largest platinum producer, major gold and diamond producer", 59.0, 7.8],
-            [3, "Botswana", 18.7, 4.1, "World's largest diamond producer by value", 2.4, 25.0],
-            [4, "Zambia", 22.5, 3.2, "Second largest copper producer in Africa", 19.5, 12.1],
-            [5, "Ghana", 75.0, 6.8, "Largest gold producer in Africa, significant bauxite reserves", 32.0, 8.5],
-            [6, "Guinea", 15.8, 2.1, "World's second largest bauxite producer, massive iron ore reserves", 13.5, 15.2],
-            [7, "Tanzania", 75.0, 2.8, "Fourth largest gold producer in Africa, growing mining sector", 63.0, 4.1],
-            [8, "Morocco", 126.0, 2.4, "World's largest phosphate exporter, controls 75% of global reserves", 37.5, 4.0]
-        ]
-        countries_df = pd.DataFrame(african_countries, columns=["CountryID", "CountryName", "GDP_BillionUSD", "MiningRevenue_BillionUSD", "KeyProjects", "Population_Millions", "MiningContribution_GDP"])
-        countries_df.to_csv(COUNTRY_FILE, index=False)
-        print("Created countries.csv with MiningContribution_GDP column")
+    page_positions = positions[start:start + query.limit]
+    rows = df.iloc[page_positions]
+    next_cursor = last_row_cursor(rows, query.sort, id_col) if start + query.limit < total else None
+    return Page(rows, total, next_cursor)
 
-    # Generate comprehensive production data
-    production_df = pd.read_csv(PROD_TS_FILE) if os.path.exists(PROD_TS_FILE) else pd.DataFrame()
-    if production_df.empty:
-        production_data = []
-        stat_id = 1
-        
-        # Define realistic production ranges for each country-mineral combination
-        production_ranges = {
-            # CountryID: {MineralID: (min_production, max_production, export_value_multiplier)}
-            1: {1: (400000, 500000, 0.003), 2: (70000, 90000, 40), 5: (18000, 25000, 0.8)},  # DR Congo
-            2: {2: (200000, 280000, 45), 3: (30000000, 40000000, 0.0001), 6: (4000000, 5000000, 0.6)},  # South Africa
-            3: {4: (20000000, 26000000, 6)},  # Botswana
-            4: {1: (300000, 400000, 0.003)},  # Zambia
-            5: {2: (500000, 700000, 42), 8: (800000, 1200000, 0.05)},  # Ghana
-            6: {3: (80000000, 120000000, 0.00008), 8: (15000000, 20000000, 0.05)},  # Guinea
-            7: {2: (400000, 600000, 41)},  # Tanzania
-            8: {7: (2500000, 3500000, 0.2)}  # Morocco
-        }
-        
-        # Generate data for 2020-2023
-        for year in range(2020, 2024):
-            for country_id, minerals in production_ranges.items():
-                for mineral_id, (min_prod, max_prod, export_multiplier) in minerals.items():
-                    # Generate realistic production with some variation
-                    production = int(min_prod + (hash(f"{year}{country_id}{mineral_id}") % (max_prod - min_prod)))
-                    export_value = production * export_multiplier
-                    
-                    production_data.append([
-                        stat_id, year, country_id, mineral_id, production, export_value
-                    ])
-                    stat_id += 1
-        
-        production_df = pd.DataFrame(production_data, columns=["StatID", "Year", "CountryID", "MineralID", "Production_tonnes", "ExportValue_BillionUSD"])
-        production_df.to_csv(PROD_TS_FILE, index=False)
-        print(f"Generated {len(production_data)} production records")
+def last_row_cursor(rows, sort, id_col):
+    """Cursor for the page after rows (None if rows is empty)"""
+    if rows.empty:
+        return None
+    # Read by column: a row of a mixed frame would turn integer IDs into floats
+    value, row_id = rows[sort].iloc[-1], rows[id_col].iloc[-1]
+    return encode_cursor(None if pd.isna(value) else (value.item() if hasattr(value, "item") else value),
+                         int(row_id))
 
-# Initialize data
-add_african_mineral_data()
+def list_controls_html(query, sortable, filterable):
+    """GET form for filters, sort column/order and page size"""
+    inputs = "".join(
+        f'<input name="{col}" placeholder="{label}" value="{html_escape(request.args.get(col, ""))}" '
+        f'style="padding: 6px; margin-right: 6px;">'
+        for col, (_, label) in filterable.items()
+    )
+    sort_options = "".join(
+        f'<option value="{col}"{" selected" if col == query.sort else ""}>{label}</option>'
+        for col, label in sortable.items()
+    )
+    return f"""
+    <form method="get" style="margin-bottom: 15px;">
+        {inputs}
+        <select name="sort" style="padding: 6px;">{sort_options}</select>
+        <select name="order" style="padding: 6px;">
+            <option value="asc">Ascending</option>
+            <option value="desc"{" selected" if query.descending else ""}>Descending</option>
+        </select>
+        <input name="per_page" type="number" min="1" max="{PAGE_SIZE_MAX}" value="{query.limit}" style="width: 70px; padding: 6px;">
+        <button type="submit" style="padding: 6px 12px;">Apply</button>
+    </form>
+    """
 
-# Helper Functions 
-def load_df(filename):
-    if os.path.exists(filename) and os.path.getsize(filename) > 0:
+def pagination_html(page):
+    args = request.args.to_dict()
+    args.pop("after", None)
+    links = [f'<span style="color: #666;">{page.total} results</span>']
+    if "after" in request.args:
+        links.append(f'<a href="{request.path}?{urlencode(args)}">First page</a>')
+    if page.next_cursor:
+        links.append(f'<a href="{request.path}?{urlencode(dict(args, after=page.next_cursor))}">Next page</a>')
+    return f'<div style="margin: 15px 0; display: flex; gap: 15px;">{"".join(links)}</div>'
+
+# Request Metrics
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("metrics_start")
+    if start is None:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    labels = {"endpoint": endpoint, "method": request.method, "status": str(response.status_code)}
+    # Keep the request's g itself: streamed bodies add to its tallies after this returns
+    tallies = g._get_current_object()
+
+    def record(size):
+        metrics.observe("mining_request_duration_seconds", time.perf_counter() - start, **labels)
+        metrics.observe("mining_response_size_bytes", size, endpoint=endpoint)
+        metrics.observe("mining_request_load_df_calls", tallies.get("load_df_calls", 0), endpoint=endpoint)
+        metrics.observe("mining_request_parsed_bytes", tallies.get("parsed_bytes", 0), endpoint=endpoint)
+
+    if not response.is_streamed:
+        record(response.calculate_content_length() or 0)
+        return response
+
+    # Streamed pages: count the body as it goes out and record once it is done
+    body, sent = response.response, [0]
+
+    def counting():
+        for chunk in body:
+            sent[0] += len(chunk) if isinstance(chunk, bytes) else len(chunk.encode("utf-8"))
+            yield chunk
+    response.response = counting()
+    response.call_on_close(lambda: record(sent[0]))
+    return response
+
+# Profiling
+# An administrator arms a route for the next N requests (or sends the header on
+# one request); those requests run under cProfile and the stats are saved in
+# PROFILE_DIR. The armed counts live in a file there so every gunicorn worker sees them.
+PROFILE_DIR = os.environ.get("MINING_PROFILE_DIR", ".profiles")
+PROFILE_HEADER = "X-Mining-Profile"
+PROFILE_TOKEN = os.environ.get("MINING_PROFILE_TOKEN")  # lets scripts use the header without an admin session
+PROFILE_KEEP = 50
+PROFILE_MAX_REQUESTS = 100
+PROFILE_TOP_FUNCTIONS = 40
+
+_profile_lock = threading.Lock()  # one profiled request at a time per process
+_armed_cache = [None, {}]          # (mtime, routes) of the armed file as last read
+
+def _armed_path():
+    return os.path.join(PROFILE_DIR, "armed.json")
+
+def armed_routes():
+    """Route -> remaining profiled requests, re-read only when the file changes"""
+    try:
+        mtime = os.stat(_armed_path()).st_mtime_ns
+    except OSError:
+        return {}
+    if _armed_cache[0] != mtime:
         try:
-            return pd.read_csv(filename)
-        except Exception as e:
-            print(f"Error loading {filename}: {e}")
-            return pd.DataFrame()
-    return pd.DataFrame()
+            with open(_armed_path()) as f:
+                _armed_cache[1] = json.load(f)
+        except (OSError, ValueError):
+            _armed_cache[1] = {}
+        _armed_cache[0] = mtime
+    return _armed_cache[1]
 
-def load_users():
-    users = {}
-    df = load_df(USER_FILE)
-    for _, row in df.iterrows():
-        users[row['Username']] = {
-            "password_hash": row['PasswordHash'],
-            "role": int(row['RoleID']),
-            "email": row['Email'],
-            "id": row['UserID']
-        }
-    return users
+def _write_armed(routes):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp = _armed_path() + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(routes, f)
+    os.replace(tmp, _armed_path())
 
-def get_role_name(role_id):
-    roles = load_df(ROLES_FILE)
-    if not roles.empty:
-        match = roles[roles["RoleID"] == role_id]
-        if not match.empty:
-            return match.iloc[0]["RoleName"]
-    return "Researcher"
+def arm_profiling(route, count):
+    """Profile the next `count` requests to route (0 disarms it)"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with file_lock(_armed_path()):
+        armed_routes()
+        routes = dict(_armed_cache[1])
+        if count > 0:
+            routes[route] = min(count, PROFILE_MAX_REQUESTS)
+        else:
+            routes.pop(route, None)
+        _write_armed(routes)
 
-def get_country_name(country_id):
-    countries = load_df(COUNTRY_FILE)
-    if not countries.empty:
-        match = countries[countries["CountryID"] == country_id]
-        if not match.empty:
-            return match.iloc[0]["CountryName"]
-    return f"Country_{country_id}"
+def _claim_armed(route):
+    """Take one of the armed requests for route; False if another worker got the last one"""
+    with file_lock(_armed_path()):
+        _armed_cache[0] = None
+        routes = dict(armed_routes())
+        if routes.get(route, 0) <= 0:
+            return False
+        routes[route] -= 1
+        if routes[route] <= 0:
+            del routes[route]
+        _write_armed(routes)
+        return True
 
-def get_mineral_name(mineral_id):
-    minerals = load_df(MINERAL_FILE)
-    if not minerals.empty:
-        match = minerals[minerals["MineralID"] == mineral_id]
-        if not match.empty:
-            return match.iloc[0]["MineralName"]
-    return f"Mineral_{mineral_id}"
+def _profile_trigger():
+    header = request.headers.get(PROFILE_HEADER)
+    if header and (session.get("role") == "Administrator" or (PROFILE_TOKEN and header == PROFILE_TOKEN)):
+        return "header"
+    routes = armed_routes()
+    if not routes:
+        return None
+    rule = str(request.url_rule) if request.url_rule else None
+    for route in (request.path, rule):
+        if route in routes and _claim_armed(route):
+            return "armed"
+    return None
 
-def get_mineral_color(mineral_name):
-    color_map = {
-        "Copper": "orange",
-        "Gold": "gold",
-        "Iron Ore": "darkred",
-        "Diamonds": "lightblue",
-        "Cobalt": "blue",
-        "Platinum": "lightgray",
-        "Phosphates": "green",
-        "Bauxite": "red"
+@app.before_request
+def start_profile():
+    trigger = _profile_trigger()
+    if trigger is None or not _profile_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is already active in this process
+        _profile_lock.release()
+        return
+    g.profile = (profiler, trigger, time.perf_counter())
+
+def _profile_info(status, trigger):
+    return {
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "method": request.method,
+        "status": status,
+        "trigger": trigger,
+        "pid": os.getpid(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
     }
-    return color_map.get(mineral_name, "purple")
 
-def get_country_production_data(country_id):
-    """Get comprehensive production data for a country"""
-    production_df = load_df(PROD_TS_FILE)
-    sites_df = load_df(DEPOSITS_FILE)
-    
-    country_production = production_df[production_df['CountryID'] == country_id]
-    country_sites = sites_df[sites_df['CountryID'] == country_id]
-    
-    mineral_production = {}
-    
-    if not country_production.empty:
-        # Get latest year data
-        latest_year = country_production['Year'].max()
-        latest_data = country_production[country_production['Year'] == latest_year]
-        
-        for _, row in latest_data.iterrows():
-            mineral_name = get_mineral_name(row['MineralID'])
-            if mineral_name not in mineral_production:
-                mineral_production[mineral_name] = {
-                    'production': 0,
-                    'export_value': 0,
-                    'sites': []
-                }
-            mineral_production[mineral_name]['production'] += row['Production_tonnes']
-            mineral_production[mineral_name]['export_value'] += row['ExportValue_BillionUSD']
-    
-    # Add site information
-    for _, site in country_sites.iterrows():
-        mineral_name = get_mineral_name(site['MineralID'])
-        if mineral_name not in mineral_production:
-            mineral_production[mineral_name] = {
-                'production': site['Production_tonnes'],
-                'export_value': 0,
-                'sites': []
-            }
-        mineral_production[mineral_name]['sites'].append({
-            'name': site['SiteName'],
-            'production': site['Production_tonnes'],
-            'mineral': mineral_name
-        })
-    
-    return mineral_production
+def _finish_profile(profiler, info, start):
+    try:
+        profiler.disable()
+        save_profile(profiler, dict(info, seconds=round(time.perf_counter() - start, 4)))
+    finally:
+        _profile_lock.release()
 
-def get_production_trends():
-    """Get production trends for charts"""
-    production_df = load_df(PROD_TS_FILE)
-    minerals_df = load_df(MINERAL_FILE)
-    
-    if production_df.empty:
+@app.after_request
+def defer_streamed_profile(response):
+    # Streamed bodies are generated after teardown, so stop the profiler once they are sent
+    if "profile" in g and response.is_streamed:
+        profiler, trigger, start = g.pop("profile")
+        info = _profile_info(response.status_code, trigger)
+        response.call_on_close(lambda: _finish_profile(profiler, info, start))
+    elif "profile" in g:
+        g.profile_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_profile(exc):
+    if "profile" in g:
+        profiler, trigger, start = g.pop("profile")
+        status = 500 if exc is not None else g.get("profile_status")
+        _finish_profile(profiler, _profile_info(status, trigger), start)
+
+def save_profile(profiler, info):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}{int(time.time() * 1000) % 1000:03d}-{os.getpid()}-{os.urandom(3).hex()}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, profile_id + ".prof"))
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w") as f:
+        json.dump(dict(info, id=profile_id), f)
+    for old in list_profiles()[PROFILE_KEEP:]:
+        for suffix in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old["id"] + suffix))
+            except OSError:
+                pass
+    return profile_id
+
+def list_profiles():
+    """Saved profile descriptions, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json") and name != "armed.json":
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda p: p["id"], reverse=True)
+
+def profile_file(profile_id):
+    """Path of a saved .prof, or None for unknown ids"""
+    if not all(c.isalnum() or c == "-" for c in profile_id):
         return None
-    
-    # Merge with mineral names
-    merged_df = production_df.merge(minerals_df[['MineralID', 'MineralName']], on='MineralID')
-    return merged_df
+    path = os.path.join(PROFILE_DIR, profile_id + ".prof")
+    return path if os.path.exists(path) else None
+
+def top_functions(path, limit=PROFILE_TOP_FUNCTIONS):
+    """(function, calls, tottime, cumtime) for the highest cumulative-time entries"""
+    stats = pstats.Stats(path).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    out = []
+    for (filename, line, func), (prim_calls, calls, tottime, cumtime, _) in rows:
+        if filename == "~":
+            where = func  # built-ins, e.g. <method 'iterrows' ...>
+        else:
+            where = f"{filename.split('site-packages' + os.sep)[-1]}:{line}({func})"
+        ncalls = str(calls) if calls == prim_calls else f"{calls}/{prim_calls}"
+        out.append((where, ncalls, tottime, cumtime))
+    return out
 
 #Decorators
 def login_required(f):
@@ -287,21 +2852,17 @@ def register():
         email = request.form["email"].strip()
         role_id = int(request.form.get("role", "3"))
 
-        users = load_users()
-        if username in users:
-            return render_template_string(ERROR_TEMPLATE, message="Username already exists. Please try another one.")
-
         pwd_hash = generate_password_hash(password)
-        df = load_df(USER_FILE)
-        next_id = df["UserID"].max() + 1 if not df.empty else 1
-        new_user = pd.DataFrame([{
-            "UserID": next_id,
-            "Username": username,
-            "PasswordHash": pwd_hash,
-            "RoleID": role_id,
-            "Email": email
-        }])
-        pd.concat([df, new_user], ignore_index=True).to_csv(USER_FILE, index=False)
+        with file_lock(USER_FILE):
+            if find_user(username) is not None:
+                return render_template_string(ERROR_TEMPLATE, message="Username already exists. Please try another one.")
+
+            append_row(USER_FILE, {
+                "Username": username,
+                "PasswordHash": pwd_hash,
+                "RoleID": role_id,
+                "Email": email
+            }, id_col="UserID")
         return redirect(url_for("login"))
 
     return '''
@@ -350,19 +2911,15 @@ def admin_login():
 
         if secret_code == ADMIN_SECRET_CODE:
             # Check if admin user exists, if not create one
-            users = load_users()
-            if username not in users:
-                pwd_hash = generate_password_hash(secret_code)  # Using secret code as password
-                df = load_df(USER_FILE)
-                next_id = df["UserID"].max() + 1 if not df.empty else 1
-                new_admin = pd.DataFrame([{
-                    "UserID": next_id,
-                    "Username": username,
-                    "PasswordHash": pwd_hash,
-                    "RoleID": 1,  # Administrator role
-                    "Email": f"{username}@admin.com"
-                }])
-                pd.concat([df, new_admin], ignore_index=True).to_csv(USER_FILE, index=False)
+            with file_lock(USER_FILE):
+                if find_user(username) is None:
+                    pwd_hash = generate_password_hash(secret_code)  # Using secret code as password
+                    append_row(USER_FILE, {
+                        "Username": username,
+                        "PasswordHash": pwd_hash,
+                        "RoleID": 1,  # Administrator role
+                        "Email": f"{username}@admin.com"
+                    }, id_col="UserID")
 
             # Log the admin in
             session["username"] = username
@@ -465,43 +3022,17 @@ def dashboard():
     role = session["role"]
     
     # Generate mineral price chart for dashboard
-    minerals_df = load_df(MINERAL_FILE)
-    if not minerals_df.empty:
-        fig = px.bar(minerals_df, x='MineralName', y='MarketPriceUSD_per_tonne',
-                    title='Mineral Market Prices', color='MineralName',
-                    labels={'MarketPriceUSD_per_tonne': 'Price per tonne (USD)', 'MineralName': 'Mineral'})
-        price_chart = fig.to_html(full_html=False, include_plotlyjs='cdn')
+    if count_rows(MINERAL_FILE) > 0:
+        price_chart = cached_chart("dashboard_prices", [MINERAL_FILE], build_dashboard_price_figure)
     else:
         price_chart = "<p>No mineral data available</p>"
     
     # Generate African mineral map for dashboard
-    sites_df = load_df(DEPOSITS_FILE)
-    if not sites_df.empty:
-        africa_map = folium.Map(location=[-8, 28], zoom_start=4)
-        
-        for _, site in sites_df.iterrows():
-            mineral_name = get_mineral_name(site['MineralID'])
-            country_name = get_country_name(site['CountryID'])
-            color = get_mineral_color(mineral_name)
-            
-            popup_text = f"""
-            <div style='min-width: 250px;'>
-                <h4 style='margin: 0; color: #333;'>{site['SiteName']}</h4>
-                <hr style='margin: 5px 0;'>
-                <p style='margin: 2px 0;'><strong>Country:</strong> {country_name}</p>
-                <p style='margin: 2px 0;'><strong>Mineral:</strong> {mineral_name}</p>
-                <p style='margin: 2px 0;'><strong>Annual Production:</strong> {site['Production_tonnes']:,.0f} tonnes</p>
-            </div>
-            """
-            
-            folium.Marker(
-                [site['Latitude'], site['Longitude']],
-                popup=folium.Popup(popup_text, max_width=300),
-                tooltip=f"{site['SiteName']} - {mineral_name}",
-                icon=folium.Icon(color=color, icon='info-sign')
-            ).add_to(africa_map)
-        
-        map_html = africa_map._repr_html_()
+    site_count = count_rows(DEPOSITS_FILE)
+    if site_count > MAP_MARKER_LIMIT:
+        map_html = map_cache.get_or_render(("lazy_site_map",), render_lazy_site_map)
+    elif site_count > 0:
+        map_html = map_cache.get_or_render(("dashboard", map_data_fingerprint()), render_dashboard_map)
     else:
         map_html = "<p>No mining site data available</p>"
 
@@ -530,7 +3061,7 @@ def dashboard():
     <html>
     <head>
         <title>African Mining Dashboard</title>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+        {plotly_script_tag()}
         <style>
             body {{ font-family: Arial, sans-serif; max-width: 1200px; margin: 0 auto; padding: 20px; }}
             .header {{ background: #f8f9fa; padding: 20px; border-radius: 5px; margin-bottom: 20px; }}
@@ -590,18 +3121,21 @@ def dashboard():
 @app.route("/countries")
 @login_required
 def list_countries():
-    countries_df = load_df(COUNTRY_FILE)
-    
-    if countries_df.empty:
+    if count_rows(COUNTRY_FILE) == 0:
         return "<h2>Country Profiles</h2><p>No country data available</p><a href='/dashboard'>Back to Dashboard</a>"
     
+    query = parse_list_query(COUNTRY_SORTS, COUNTRY_FILTERS, "CountryID")
+    page = paginate(COUNTRY_FILE, "CountryID", query)
+    countries_df = with_text(page.rows, COUNTRY_FILE, "CountryID")
+    mineral_counts = country_production_summary().mineral_counts
+    
     html = """
     <h1>African Mining Country Profiles</h1>
     <p style="color: #666; margin-bottom: 30px;">
         Comprehensive overview of major mineral-producing countries in Africa with production statistics, 
         economic data, and key mining projects.
     </p>
-    
+    """ + list_controls_html(query, COUNTRY_SORTS, COUNTRY_FILTERS) + """
     <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(350px, 1fr)); gap: 20px;">
     """
     
@@ -614,8 +3148,7 @@ def list_countries():
         mining_contribution = country.get('MiningContribution_GDP', 0)
         key_projects = country.get('KeyProjects', 'No information available')
         
-        production_data = get_country_production_data(country['CountryID'])
-        total_minerals = len(production_data) if production_data else 0
+        total_minerals = int(mineral_counts.get(country['CountryID'], 0))
         
         html += f"""
         <div style="border: 1px solid #ddd; border-radius: 8px; padding: 20px; background: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
@@ -649,7 +3182,7 @@ def list_countries():
         </div>
         """
     
-    html += "</div>"
+    html += "</div>" + pagination_html(page)
     
     back_btn = "<div style='margin-top: 30px;'><a href='/dashboard' style='padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;'>Back to Dashboard</a></div>"
     return html + back_btn
@@ -657,8 +3190,7 @@ def list_countries():
 @app.route("/country/<int:country_id>")
 @login_required
 def country_profile(country_id):
-    countries_df = load_df(COUNTRY_FILE)
-    country = countries_df[countries_df['CountryID'] == country_id]
+    country = with_text(find_rows(COUNTRY_FILE, CountryID=country_id), COUNTRY_FILE, "CountryID")
     
     if country.empty:
         return "Country not found", 404
@@ -748,21 +3280,16 @@ def country_profile(country_id):
 @login_required
 @admin_required
 def admin_panel():
-    users_df = load_df(USER_FILE)
-    countries_df = load_df(COUNTRY_FILE)
-    minerals_df = load_df(MINERAL_FILE)
-    sites_df = load_df(DEPOSITS_FILE)
-    
     admin_content = f"""
     <h1>Administrator Panel</h1>
     
     <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; margin-bottom: 30px;">
         <div style="background: #e8f4f8; padding: 20px; border-radius: 8px;">
             <h3>System Overview</h3>
-            <p><strong>Total Users:</strong> {len(users_df)}</p>
-            <p><strong>Countries:</strong> {len(countries_df)}</p>
-            <p><strong>Minerals:</strong> {len(minerals_df)}</p>
-            <p><strong>Mining Sites:</strong> {len(sites_df)}</p>
+            <p><strong>Total Users:</strong> {count_rows(USER_FILE)}</p>
+            <p><strong>Countries:</strong> {count_rows(COUNTRY_FILE)}</p>
+            <p><strong>Minerals:</strong> {count_rows(MINERAL_FILE)}</p>
+            <p><strong>Mining Sites:</strong> {count_rows(DEPOSITS_FILE)}</p>
         </div>
         
         <div style="background: #fff3cd; padding: 20px; border-radius: 8px;">
@@ -771,6 +3298,8 @@ def admin_panel():
                 <li style="margin: 10px 0;"><a href="/admin/users" style="color: #856404; text-decoration: none; font-weight: bold;">Manage Users</a></li>
                 <li style="margin: 10px 0;"><a href="/minerals/add" style="color: #856404; text-decoration: none; font-weight: bold;">Add New Mineral</a></li>
                 <li style="margin: 10px 0;"><a href="/admin/countries" style="color: #856404; text-decoration: none; font-weight: bold;">Manage Countries</a></li>
+                <li style="margin: 10px 0;"><a href="/admin/import" style="color: #856404; text-decoration: none; font-weight: bold;">Bulk Import Data</a></li>
+                <li style="margin: 10px 0;"><a href="/admin/profiling" style="color: #856404; text-decoration: none; font-weight: bold;">Request Profiling</a></li>
             </ul>
         </div>
     </div>
@@ -783,65 +3312,65 @@ def admin_panel():
 @login_required
 @admin_required
 def manage_users():
-    users_df = load_df(USER_FILE)
+    query = parse_list_query(USER_SORTS, USER_FILTERS, "UserID")
+    page = paginate(USER_FILE, "UserID", query)
+    users_df = page.rows
     
-    users_html = "<h2>User Management</h2>"
-    
-    if not users_df.empty:
-        users_html += """
-        <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
-            <thead style="background: #f8f9fa;">
-                <tr>
-                    <th style="padding: 10px;">ID</th>
-                    <th style="padding: 10px;">Username</th>
-                    <th style="padding: 10px;">Email</th>
-                    <th style="padding: 10px;">Role</th>
-                    <th style="padding: 10px;">Actions</th>
-                </tr>
-            </thead>
-            <tbody>
-        """
+    def generate():
+        yield "<h2>User Management</h2>" + list_controls_html(query, USER_SORTS, USER_FILTERS)
         
-        for _, user in users_df.iterrows():
-            role_name = get_role_name(user['RoleID'])
-            users_html += f"""
-            <tr>
-                <td style="padding: 10px;">{user['UserID']}</td>
-                <td style="padding: 10px;">{user['Username']}</td>
-                <td style="padding: 10px;">{user['Email']}</td>
-                <td style="padding: 10px;">{role_name}</td>
-                <td style="padding: 10px;">
-                    <a href="/admin/users/delete/{user['UserID']}" onclick="return confirm('Are you sure you want to delete this user?')" style="color: #dc3545; text-decoration: none;">Delete</a>
-                </td>
-            </tr>
+        if not users_df.empty:
+            yield """
+            <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 20px;">
+                <thead style="background: #f8f9fa;">
+                    <tr>
+                        <th style="padding: 10px;">ID</th>
+                        <th style="padding: 10px;">Username</th>
+                        <th style="padding: 10px;">Email</th>
+                        <th style="padding: 10px;">Role</th>
+                        <th style="padding: 10px;">Actions</th>
+                    </tr>
+                </thead>
+                <tbody>
             """
+            
+            for chunk in iter_row_chunks(users_df):
+                role_names = map_role_names(chunk['RoleID'])
+                yield "".join(f"""
+                <tr>
+                    <td style="padding: 10px;">{user['UserID']}</td>
+                    <td style="padding: 10px;">{user['Username']}</td>
+                    <td style="padding: 10px;">{user['Email']}</td>
+                    <td style="padding: 10px;">{role_name}</td>
+                    <td style="padding: 10px;">
+                        <a href="/admin/users/delete/{user['UserID']}" onclick="return confirm('Are you sure you want to delete this user?')" style="color: #dc3545; text-decoration: none;">Delete</a>
+                    </td>
+                </tr>
+                """ for user, role_name in zip(chunk.to_dict("records"), role_names))
+            
+            yield "</tbody></table>" + pagination_html(page)
+        else:
+            yield "<p>No users found.</p>"
         
-        users_html += "</tbody></table>"
-    else:
-        users_html += "<p>No users found.</p>"
-    
-    users_html += """
-    <div style="margin-top: 20px;">
-        <a href="/admin" style="padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;">Back to Admin Panel</a>
-    </div>
-    """
+        yield """
+        <div style="margin-top: 20px;">
+            <a href="/admin" style="padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;">Back to Admin Panel</a>
+        </div>
+        """
     
-    return users_html
+    return Response(stream_with_context(generate()), mimetype="text/html")
 
 @app.route("/admin/users/delete/<int:user_id>")
 @login_required
 @admin_required
 def delete_user(user_id):
-    users_df = load_df(USER_FILE)
-    
-    if not users_df.empty:
+    with file_lock(USER_FILE):
         # Don't allow deleting the current user
         current_user = session.get("username")
-        user_to_delete = users_df[users_df['UserID'] == user_id]
+        user_to_delete = find_rows(USER_FILE, UserID=user_id)
         
         if not user_to_delete.empty and user_to_delete.iloc[0]['Username'] != current_user:
-            users_df = users_df[users_df['UserID'] != user_id]
-            users_df.to_csv(USER_FILE, index=False)
+            delete_rows(USER_FILE, UserID=user_id)
     
     return redirect("/admin/users")
 
@@ -849,9 +3378,11 @@ def delete_user(user_id):
 @login_required
 @admin_required
 def manage_countries():
-    countries_df = load_df(COUNTRY_FILE)
+    query = parse_list_query(COUNTRY_SORTS, COUNTRY_FILTERS, "CountryID")
+    page = paginate(COUNTRY_FILE, "CountryID", query)
+    countries_df = page.rows
     
-    countries_html = "<h2>Country Management</h2>"
+    countries_html = "<h2>Country Management</h2>" + list_controls_html(query, COUNTRY_SORTS, COUNTRY_FILTERS)
     
     if not countries_df.empty:
         countries_html += """
@@ -883,7 +3414,7 @@ def manage_countries():
             </tr>
             """
         
-        countries_html += "</tbody></table>"
+        countries_html += "</tbody></table>" + pagination_html(page)
     else:
         countries_html += "<p>No countries found.</p>"
     
@@ -895,16 +3426,148 @@ def manage_countries():
     
     return countries_html
 
+@app.route("/admin/import", methods=["GET", "POST"])
+@login_required
+@admin_required
+def admin_import():
+    result_html = ""
+    if request.method == "POST":
+        dataset = request.form.get("dataset", "")
+        upload = request.files.get("file")
+        if dataset not in IMPORT_SPECS or upload is None or not upload.filename:
+            result_html = "<p style='color: #dc3545;'>Choose a dataset and a CSV file.</p>"
+        else:
+            result = import_rows(dataset, upload.stream)
+            if result.error_count:
+                rows = "".join(
+                    f"<tr><td style='padding: 4px 10px;'>{line or '-'}</td><td style='padding: 4px 10px;'>{html_escape(message)}</td></tr>"
+                    for line, message in result.errors)
+                result_html = f"""
+                <p style='color: #dc3545;'><strong>Import rejected:</strong> {result.error_count} problem(s) found, nothing was written.</p>
+                <table style='border-collapse: collapse; margin-bottom: 20px;'>
+                    <tr style='background: #343a40; color: white;'><th style='padding: 4px 10px;'>Line</th><th style='padding: 4px 10px;'>Problem</th></tr>
+                    {rows}
+                </table>"""
+            else:
+                result_html = f"<p style='color: #28a745;'><strong>Imported {result.rows} rows</strong> into {html_escape(dataset)}.</p>"
+
+    options = "".join(f"<option value='{name}'>{name}</option>" for name in IMPORT_SPECS)
+    return f"""
+    <h2>Bulk Import Data</h2>
+    {result_html}
+    <p>Upload a CSV with the same columns as the table. Every row is checked first; the file is imported
+    in one step only if all rows are valid. Leave ID columns blank to have them assigned.</p>
+    <form method="post" enctype="multipart/form-data">
+        <div style="margin-bottom: 15px;">
+            <label>Dataset:</label><br>
+            <select name="dataset" style="width: 300px; padding: 8px;">{options}</select>
+        </div>
+        <div style="margin-bottom: 15px;">
+            <label>CSV File:</label><br>
+            <input type="file" name="file" accept=".csv" required>
+        </div>
+        <button type="submit" style="padding: 10px 20px; background: #28a745; color: white; border: none; border-radius: 5px;">Import</button>
+    </form>
+    <div style="margin-top: 20px;"><a href="/admin">Back to Admin Panel</a></div>
+    """
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+@login_required
+@admin_required
+def admin_profiling():
+    message = ""
+    if request.method == "POST":
+        route = request.form.get("route", "").strip()
+        count = request.form.get("count", "0")
+        if not route.startswith("/") or not count.isdigit():
+            message = "<p style='color: #dc3545;'>Enter a route starting with / and a number of requests.</p>"
+        else:
+            arm_profiling(route, int(count))
+            message = (f"<p style='color: #28a745;'>Profiling the next {min(int(count), PROFILE_MAX_REQUESTS)} request(s) to {html_escape(route)}.</p>"
+                       if int(count) else f"<p>Stopped profiling {html_escape(route)}.</p>")
+
+    armed = "".join(
+        f"""<tr><td style='padding: 4px 10px;'>{html_escape(route)}</td><td style='padding: 4px 10px;'>{remaining}</td>
+        <td style='padding: 4px 10px;'><form method='post' style='margin: 0;'><input type='hidden' name='route' value='{html_escape(route)}'>
+        <input type='hidden' name='count' value='0'><button type='submit'>Cancel</button></form></td></tr>"""
+        for route, remaining in sorted(armed_routes().items()))
+    profiles = "".join(
+        f"""<tr><td style='padding: 4px 10px;'>{p['created']}</td>
+        <td style='padding: 4px 10px;'><a href='/admin/profiling/{p['id']}'>{html_escape(p['method'])} {html_escape(p['path'])}</a></td>
+        <td style='padding: 4px 10px;'>{p['status']}</td><td style='padding: 4px 10px;'>{p['seconds'] * 1000:,.1f} ms</td>
+        <td style='padding: 4px 10px;'>{p['trigger']} (pid {p['pid']})</td>
+        <td style='padding: 4px 10px;'><a href='/admin/profiling/{p['id']}.prof'>.prof</a></td></tr>"""
+        for p in list_profiles())
+
+    return f"""
+    <h2>Request Profiling</h2>
+    {message}
+    <p>Requests are run under cProfile and kept in {html_escape(PROFILE_DIR)} (newest {PROFILE_KEEP}). Arm a route such as
+    <code>/market</code> or <code>/country/&lt;int:country_id&gt;</code>, or send a single request with the
+    <code>{PROFILE_HEADER}: 1</code> header while logged in as an administrator.</p>
+    <form method="post" style="margin-bottom: 20px;">
+        <input type="text" name="route" placeholder="/market" required style="width: 300px; padding: 8px;">
+        <input type="number" name="count" value="5" min="1" max="{PROFILE_MAX_REQUESTS}" style="width: 80px; padding: 8px;">
+        <button type="submit" style="padding: 8px 16px; background: #28a745; color: white; border: none; border-radius: 5px;">Profile next requests</button>
+    </form>
+    <h3>Armed Routes</h3>
+    {f"<table style='border-collapse: collapse;'><tr style='background: #343a40; color: white;'><th style='padding: 4px 10px;'>Route</th><th style='padding: 4px 10px;'>Remaining</th><th></th></tr>{armed}</table>" if armed else "<p>None.</p>"}
+    <h3>Saved Profiles</h3>
+    {f"<table style='border-collapse: collapse;'><tr style='background: #343a40; color: white;'><th style='padding: 4px 10px;'>Captured</th><th style='padding: 4px 10px;'>Request</th><th style='padding: 4px 10px;'>Status</th><th style='padding: 4px 10px;'>Time</th><th style='padding: 4px 10px;'>Trigger</th><th></th></tr>{profiles}</table>" if profiles else "<p>No profiles captured yet.</p>"}
+    <div style="margin-top: 20px;"><a href="/admin">Back to Admin Panel</a></div>
+    """
+
+@app.route("/admin/profiling/<profile_id>.prof")
+@login_required
+@admin_required
+def download_profile(profile_id):
+    path = profile_file(profile_id)
+    if path is None:
+        return "Profile not found", 404
+    with open(path, "rb") as f:
+        data = f.read()
+    return Response(data, mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.prof"})
+
+@app.route("/admin/profiling/<profile_id>")
+@login_required
+@admin_required
+def view_profile(profile_id):
+    path = profile_file(profile_id)
+    if path is None:
+        return "Profile not found", 404
+    info = next((p for p in list_profiles() if p["id"] == profile_id), {})
+    rows = "".join(
+        f"""<tr><td style='padding: 4px 10px; font-family: monospace;'>{html_escape(where)}</td>
+        <td style='padding: 4px 10px; text-align: right;'>{ncalls}</td>
+        <td style='padding: 4px 10px; text-align: right;'>{tottime * 1000:,.2f}</td>
+        <td style='padding: 4px 10px; text-align: right;'>{cumtime * 1000:,.2f}</td></tr>"""
+        for where, ncalls, tottime, cumtime in top_functions(path))
+    return f"""
+    <h2>Profile: {html_escape(info.get('method', ''))} {html_escape(info.get('path', profile_id))}</h2>
+    <p>Captured {info.get('created', '')} by worker {info.get('pid', '')}, status {info.get('status', '')},
+    {info.get('seconds', 0) * 1000:,.1f} ms. <a href="/admin/profiling/{profile_id}.prof">Download .prof</a>
+    (open with <code>python -m pstats</code> or snakeviz).</p>
+    <table style="border-collapse: collapse;">
+        <tr style="background: #343a40; color: white;"><th style="padding: 4px 10px;">Function</th><th style="padding: 4px 10px;">Calls</th>
+        <th style="padding: 4px 10px;">Own ms</th><th style="padding: 4px 10px;">Cumulative ms</th></tr>
+        {rows}
+    </table>
+    <div style="margin-top: 20px;"><a href="/admin/profiling">Back to Profiling</a></div>
+    """
+
 #Mineral Management
 @app.route("/minerals")
 @login_required
 def list_minerals():
-    minerals_df = load_df(MINERAL_FILE)
-    
-    if minerals_df.empty:
+    if count_rows(MINERAL_FILE) == 0:
         return "<h2>Minerals</h2><p>No mineral data available</p><a href='/dashboard'>Back to Dashboard</a>"
     
-    html = "<h1>Mineral Database</h1>"
+    query = parse_list_query(MINERAL_SORTS, MINERAL_FILTERS, "MineralID")
+    page = paginate(MINERAL_FILE, "MineralID", query)
+    minerals_df = with_text(page.rows, MINERAL_FILE, "MineralID")
+    
+    html = "<h1>Mineral Database</h1>" + list_controls_html(query, MINERAL_SORTS, MINERAL_FILTERS)
     
     for _, mineral in minerals_df.iterrows():
         html += f"""
@@ -915,6 +3578,7 @@ def list_minerals():
         </div>
         """
     
+    html += pagination_html(page)
     html += "<div style='margin-top: 20px;'><a href='/dashboard' style='padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;'>Back to Dashboard</a></div>"
     return html
 
@@ -927,17 +3591,11 @@ def add_mineral():
         description = request.form["description"].strip()
         price = float(request.form["price"])
         
-        minerals_df = load_df(MINERAL_FILE)
-        next_id = minerals_df["MineralID"].max() + 1 if not minerals_df.empty else 1
-        
-        new_mineral = pd.DataFrame([{
-            "MineralID": next_id,
+        append_row(MINERAL_FILE, {
             "MineralName": mineral_name,
             "Description": description,
             "MarketPriceUSD_per_tonne": price
-        }])
-        
-        pd.concat([minerals_df, new_mineral], ignore_index=True).to_csv(MINERAL_FILE, index=False)
+        }, id_col="MineralID")
         return redirect("/minerals")
     
     return '''
@@ -967,34 +3625,21 @@ def add_mineral():
 @app.route("/charts")
 @login_required
 def charts_page():
-    trends_data = get_production_trends()
+    charts_html = plotly_script_tag() + "<h2>Interactive Charts & Analytics</h2>"
     
-    charts_html = "<h2>Interactive Charts & Analytics</h2>"
-    
-    if trends_data is not None and not trends_data.empty:
+    if not production_rollups.frame("year_mineral").empty:
         # Chart 1: Production Trends Over Time
-        yearly_production = trends_data.groupby(['Year', 'MineralName'])['Production_tonnes'].sum().reset_index()
-        fig1 = px.line(yearly_production, x='Year', y='Production_tonnes', color='MineralName',
-                      title='Mineral Production Trends Over Time (2020-2023)',
-                      labels={'Production_tonnes': 'Production (tonnes)', 'Year': 'Year'})
-        charts_html += f"<h3>Production Trends</h3>{fig1.to_html(full_html=False, include_plotlyjs=True)}"
+        fig1 = cached_chart("production_trends", [PROD_TS_FILE, MINERAL_FILE], build_production_trend_figure)
+        charts_html += f"<h3>Production Trends</h3>{fig1}"
         
         # Chart 2: Export Values by Country
-        export_by_country = trends_data.groupby('CountryID')['ExportValue_BillionUSD'].sum().reset_index()
-        export_by_country['CountryName'] = export_by_country['CountryID'].apply(get_country_name)
-        fig2 = px.bar(export_by_country, x='CountryName', y='ExportValue_BillionUSD',
-                     title='Total Export Values by Country (2020-2023)',
-                     labels={'ExportValue_BillionUSD': 'Export Value (Billion USD)'})
-        charts_html += f"<h3>Export Values</h3>{fig2.to_html(full_html=False, include_plotlyjs=False)}"
+        fig2 = cached_chart("exports_by_country", [PROD_TS_FILE, COUNTRY_FILE], build_export_figure)
+        charts_html += f"<h3>Export Values</h3>{fig2}"
         
         # Chart 3: Mineral Prices
-        minerals_df = load_df(MINERAL_FILE)
-        if not minerals_df.empty:
-            fig3 = px.bar(minerals_df, x='MineralName', y='MarketPriceUSD_per_tonne',
-                         title='Mineral Market Prices (USD per tonne)',
-                         color='MineralName',
-                         labels={'MarketPriceUSD_per_tonne': 'Price (USD/tonne)'})
-            charts_html += f"<h3>Mineral Prices</h3>{fig3.to_html(full_html=False, include_plotlyjs=False)}"
+        if count_rows(MINERAL_FILE) > 0:
+            fig3 = cached_chart("mineral_prices", [MINERAL_FILE], build_price_figure)
+            charts_html += f"<h3>Mineral Prices</h3>{fig3}"
     else:
         charts_html += "<p>No production data available for charts. Please check if production_stats.csv is properly populated.</p>"
     
@@ -1006,45 +3651,33 @@ def charts_page():
     
     return charts_html
 
+# Static Assets
+@app.route("/assets/plotly-<digest>.min.js")
+def plotly_js(digest):
+    current, js, js_gzip = plotly_asset()
+    if digest != current:
+        return redirect(url_for("plotly_js", digest=current))
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = app.response_class(js_gzip, mimetype="application/javascript")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = app.response_class(js, mimetype="application/javascript")
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.set_etag(current)
+    return response.make_conditional(request)
+
 # African Mineral Map Page
 @app.route("/map")
 @login_required
 def african_mineral_map():
-    sites_df = load_df(DEPOSITS_FILE)
-    minerals_df = load_df(MINERAL_FILE)
+    site_count = count_rows(DEPOSITS_FILE)
     
-    if not sites_df.empty:
-        m = folium.Map(location=[-8, 28], zoom_start=4, tiles='OpenStreetMap')
-        
-        for _, site in sites_df.iterrows():
-            mineral_name = get_mineral_name(site['MineralID'])
-            country_name = get_country_name(site['CountryID'])
-            color = get_mineral_color(mineral_name)
-            
-            mineral_data = minerals_df[minerals_df['MineralID'] == site['MineralID']]
-            price = mineral_data['MarketPriceUSD_per_tonne'].iloc[0] if not mineral_data.empty else "N/A"
-            
-            popup_text = f"""
-            <div style='min-width: 280px;'>
-                <h4 style='color: #2c3e50; margin-bottom: 10px;'>{site['SiteName']}</h4>
-                <div style='border-left: 4px solid {color}; padding-left: 10px;'>
-                    <p style='margin: 5px 0;'><strong>Country:</strong> {country_name}</p>
-                    <p style='margin: 5px 0;'><strong>Mineral:</strong> {mineral_name}</p>
-                    <p style='margin: 5px 0;'><strong>Annual Production:</strong> {site['Production_tonnes']:,.0f} tonnes</p>
-                    <p style='margin: 5px 0;'><strong>Market Price:</strong> ${price:,.2f}/tonne</p>
-                    <p style='margin: 5px 0;'><strong>Coordinates:</strong> {site['Latitude']:.4f}, {site['Longitude']:.4f}</p>
-                </div>
-            </div>
-            """
-            
-            folium.Marker(
-                [site['Latitude'], site['Longitude']],
-                popup=folium.Popup(popup_text, max_width=350),
-                tooltip=f"{site['SiteName']} - {mineral_name}",
-                icon=folium.Icon(color=color, icon='info-sign')
-            ).add_to(m)
-        
-        map_html = m._repr_html_()
+    if site_count > 0:
+        if request.args.get("mode") == "cluster" or site_count > MAP_MARKER_LIMIT:
+            map_html = map_cache.get_or_render(("lazy_site_map",), render_lazy_site_map)
+        else:
+            map_html = map_cache.get_or_render(("site_map", map_data_fingerprint()), render_site_map)
         
         page_content = f"""
         <h1>African Mineral Deposits Map</h1>
@@ -1064,6 +3697,308 @@ def african_mineral_map():
     back_btn = "<div style='margin-top: 20px;'><a href='/dashboard' style='padding: 10px 20px; background: #3498db; color: white; text-decoration: none; border-radius: 5px;'>Back to Dashboard</a></div>"
     return page_content + back_btn
 
+# JSON API
+API_VERSION = "v1"
+
+def data_etag(*filenames):
+    """Weak validator for responses derived from the given tables"""
+    return hashlib.sha1(repr((API_VERSION, store.version(*filenames))).encode("utf-8")).hexdigest()
+
+def df_records(df):
+    """DataFrame rows as JSON-safe dicts (NaN -> null)"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def conditional_json(*filenames):
+    """Serve the view's dict as JSON with an ETag from the tables' data version.
+
+    A request whose If-None-Match carries the current ETag gets a 304 without
+    the view running at all.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            etag = data_etag(*filenames)
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                result = f(*args, **kwargs)
+                if not isinstance(result, dict):
+                    return result  # error response
+                response = jsonify(result)
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
+
+def _int_args(*names):
+    """Integer query parameters that were supplied, raising ValueError if malformed"""
+    return {name: int(request.args[name]) for name in names if request.args.get(name)}
+
+@app.route(f"/api/{API_VERSION}/minerals")
+@login_required
+@conditional_json(MINERAL_FILE)
+def api_minerals():
+    return {"minerals": df_records(with_text(load_df(MINERAL_FILE), MINERAL_FILE, "MineralID"))}
+
+@app.route(f"/api/{API_VERSION}/countries")
+@login_required
+@conditional_json(COUNTRY_FILE, PROD_TS_FILE, DEPOSITS_FILE, MINERAL_FILE)
+def api_countries():
+    countries = with_text(load_df(COUNTRY_FILE), COUNTRY_FILE, "CountryID")
+    counts = country_production_summary().mineral_counts
+    if not countries.empty:
+        countries = countries.assign(MineralCount=countries["CountryID"].map(counts).fillna(0).astype(int))
+    return {"countries": df_records(countries)}
+
+@app.route(f"/api/{API_VERSION}/countries/<int:country_id>")
+@login_required
+@conditional_json(COUNTRY_FILE, PROD_TS_FILE, DEPOSITS_FILE, MINERAL_FILE)
+def api_country(country_id):
+    country = with_text(find_rows(COUNTRY_FILE, CountryID=country_id), COUNTRY_FILE, "CountryID")
+    if country.empty:
+        return jsonify({"error": "Country not found"}), 404
+    return {"country": df_records(country)[0], "production": get_country_production_data(country_id)}
+
+@app.route(f"/api/{API_VERSION}/sites")
+@login_required
+@conditional_json(DEPOSITS_FILE)
+def api_sites():
+    try:
+        filters = _int_args("CountryID", "MineralID")
+    except ValueError:
+        return jsonify({"error": "CountryID and MineralID must be integers"}), 400
+    return {"sites": df_records(find_rows(DEPOSITS_FILE, **filters))}
+
+@app.route(f"/api/{API_VERSION}/production")
+@login_required
+@conditional_json(PROD_TS_FILE)
+def api_production():
+    try:
+        _int_args("CountryID", "MineralID", "Year", "per_page")
+    except ValueError:
+        return jsonify({"error": "CountryID, MineralID, Year and per_page must be integers"}), 400
+    page = paginate(PROD_TS_FILE, "StatID", parse_list_query(PRODUCTION_SORTS, PRODUCTION_FILTERS, "StatID"))
+    return {"production": df_records(page.rows), "total": page.total, "next_cursor": page.next_cursor}
+
+@app.route(f"/api/{API_VERSION}/trends")
+@login_required
+@conditional_json(PROD_TS_FILE, MINERAL_FILE, COUNTRY_FILE)
+def api_trends():
+    by_year = production_rollups.frame("year_mineral")
+    by_year = by_year.assign(MineralName=map_mineral_names(by_year["MineralID"]))
+    by_country = production_rollups.frame("country_mineral").groupby("CountryID")[ROLLUP_VALUES].sum().reset_index()
+    by_country["CountryName"] = map_country_names(by_country["CountryID"])
+    return {"by_year_mineral": df_records(by_year), "by_country": df_records(by_country)}
+
+@app.route(f"/api/{API_VERSION}/prices")
+@login_required
+@conditional_json(PRICES_FILE, PROD_TS_FILE, MINERAL_FILE)
+def api_prices():
+    try:
+        args = _int_args("from", "to", "every")
+    except ValueError:
+        return jsonify({"error": "from, to and every must be integers"}), 400
+    if args.get("every", 1) < 1:
+        return jsonify({"error": "every must be at least 1"}), 400
+    history = price_history()
+    start, end = args.get("from"), args.get("to")
+    minerals = request.args.getlist("mineral") or None
+    matrix = history.resample(args["every"], start=start, end=end) if args.get("every", 1) > 1 else history.range(start, end)
+    if minerals is not None:
+        matrix = matrix[[m for m in minerals if m in matrix.columns]]
+    summary = history.summary(start, end)
+    if minerals is not None:
+        summary = summary[summary["mineral"].isin(minerals)]
+    revenue = revenue_by_year_mineral()
+    revenue = revenue[revenue["Revenue"].notna() & revenue["Year"].between(start or -np.inf, end or np.inf)]
+    return {
+        "prices": {m: df_records(matrix[m].dropna().rename("price").rename_axis("year").reset_index()) for m in matrix.columns},
+        "summary": df_records(summary),
+        "revenue": df_records(revenue),
+    }
+
+@app.route("/export/<name>.<fmt>")
+@login_required
+def export_table(name, fmt):
+    if name not in EXPORTS or fmt not in ("csv", "ndjson"):
+        return "Unknown export", 404
+    filename, hidden, admin_only = EXPORTS[name]
+    if admin_only and session.get("role") != "Administrator":
+        return "Access denied. Administrator role required.", 403
+    
+    chunks = (chunk.drop(columns=hidden, errors="ignore") for chunk in iter_chunks(filename))
+    if fmt == "csv":
+        body, mimetype = stream_csv(chunks), "text/csv"
+    else:
+        body, mimetype = stream_ndjson(chunks), "application/x-ndjson"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={name}.{fmt}"
+    return response
+
+# Site Map API
+# Spatial queries over the sites table, filtered with the same CountryID /
+# MineralID parameters as /api/v1/sites
+@app.route(f"/api/{API_VERSION}/sites/geojson")
+@login_required
+def sites_geojson():
+    bbox = parse_bbox(request.args.get("bbox", "-180,-90,180,90"))
+    if bbox is None:
+        return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    try:
+        zoom = min(max(int(request.args.get("zoom", CLUSTER_MAX_ZOOM)), 0), 20)
+    except ValueError:
+        return jsonify({"error": "zoom must be an integer"}), 400
+    return jsonify({"type": "FeatureCollection", "features": site_features_in_bbox(bbox, zoom)})
+
+def _site_query_filters():
+    """Optional MineralID / CountryID query parameters; raises ValueError if malformed"""
+    filters = _int_args("MineralID", "CountryID")
+    return filters.get("MineralID"), filters.get("CountryID")
+
+def _limit_param():
+    """limit query parameter capped at MAX_FEATURES; raises ValueError unless a positive integer"""
+    limit = int(request.args.get("limit", MAX_FEATURES))
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_FEATURES)
+
+def _query_point():
+    lat, lon = float(request.args["lat"]), float(request.args["lon"])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon out of range")
+    return lat, lon
+
+@app.route(f"/api/{API_VERSION}/sites/search")
+@login_required
+def sites_search():
+    bbox = parse_bbox(request.args.get("bbox", ""))
+    if bbox is None:
+        return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    try:
+        mineral_id, country_id = _site_query_filters()
+        limit = _limit_param()
+    except ValueError:
+        return jsonify({"error": "MineralID and CountryID must be integers and limit a positive integer"}), 400
+    rows = spatial_index().bbox(bbox, mineral_id, country_id, limit=limit)
+    return jsonify({"sites": site_records(rows)})
+
+@app.route(f"/api/{API_VERSION}/sites/nearest")
+@login_required
+def sites_nearest():
+    try:
+        lat, lon = _query_point()
+        mineral_id, country_id = _site_query_filters()
+        k = min(max(int(request.args.get("k", 5)), 1), MAX_FEATURES)
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lon are required; k, MineralID and CountryID must be integers"}), 400
+    rows, dist = spatial_index().nearest(lat, lon, k, mineral_id, country_id)
+    return jsonify({"sites": site_records(rows, dist)})
+
+@app.route(f"/api/{API_VERSION}/sites/within")
+@login_required
+def sites_within():
+    try:
+        lat, lon = _query_point()
+        radius_km = float(request.args["radius_km"])
+        mineral_id, country_id = _site_query_filters()
+        limit = _limit_param()
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat, lon and radius_km are required; MineralID and CountryID must be integers "
+                                 "and limit a positive integer"}), 400
+    if not math.isfinite(radius_km) or radius_km < 0:
+        return jsonify({"error": "radius_km must be a finite, non-negative number"}), 400
+    rows, dist = spatial_index().within(lat, lon, radius_km, mineral_id, country_id)
+    return jsonify({"sites": site_records(rows[:limit], dist[:limit])})
+
+@app.route(f"/api/{API_VERSION}/sites/<int:site_id>/popup")
+@login_required
+def site_popup(site_id):
+    points = site_points()
+    match = points[points["SiteID"] == site_id]
+    if match.empty:
+        return "Site not found", 404
+    site = match.iloc[0]
+    price = mineral_price_index().get(site["MineralID"], "N/A")
+    return site_popup_html(site, site["MineralName"], site["CountryName"], site["Color"], price)
+
+def _fmt(value, spec, suffix=""):
+    return "-" if pd.isna(value) else f"{value:{spec}}{suffix}"
+
+def price_history_html(start=None, end=None):
+    """Price analytics and revenue tables for the market page"""
+    history = price_history()
+    html = "<h3>Price History</h3>"
+    if not len(history):
+        return html + "<p style='color: #666;'>No price history loaded yet. Administrators can add it from <a href='/admin/import'>Bulk Import</a> (prices dataset).</p>"
+
+    html += f"""
+    <form method="get" style="margin-bottom: 10px;">
+        From <input type="number" name="from" value="{start or ''}" style="width: 80px;">
+        to <input type="number" name="to" value="{end or ''}" style="width: 80px;">
+        <button type="submit">Apply</button>
+    </form>
+    <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 30px;">
+        <thead style="background: #f8f9fa;"><tr>
+            <th style="padding: 8px;">Mineral</th><th style="padding: 8px;">Years</th>
+            <th style="padding: 8px;">First Price</th><th style="padding: 8px;">Latest Price</th>
+            <th style="padding: 8px;">Annual Growth (CAGR)</th><th style="padding: 8px;">Volatility</th>
+        </tr></thead><tbody>
+    """
+    html += "".join(f"""
+        <tr>
+            <td style="padding: 8px;"><strong>{html_escape(row['mineral'])}</strong></td>
+            <td style="padding: 8px;">{row['first_year']}-{row['last_year']}</td>
+            <td style="padding: 8px;">${row['first_price']:,.2f}</td>
+            <td style="padding: 8px;">${row['last_price']:,.2f}</td>
+            <td style="padding: 8px;">{_fmt(row['cagr'] * 100, '.1f', '%')}</td>
+            <td style="padding: 8px;">{_fmt(row['volatility'] * 100, '.1f', '%')}</td>
+        </tr>""" for row in history.summary(start, end).to_dict("records"))
+    html += "</tbody></table>"
+
+    revenue = revenue_by_year_mineral()
+    revenue = revenue[revenue["Revenue"].notna()]
+    if start is not None:
+        revenue = revenue[revenue["Year"] >= start]
+    if end is not None:
+        revenue = revenue[revenue["Year"] <= end]
+    if not revenue.empty:
+        by_year = revenue.groupby("Year")["Revenue"].sum().sort_index(ascending=False).head(10)
+        html += "<h3>Production Revenue at Historical Prices</h3><table border='1' style='border-collapse: collapse; margin-bottom: 30px;'>"
+        html += "<tr style='background: #f8f9fa;'><th style='padding: 8px;'>Year</th><th style='padding: 8px;'>Revenue (USD)</th></tr>"
+        html += "".join(f"<tr><td style='padding: 8px;'>{year}</td><td style='padding: 8px;'>${value:,.0f}</td></tr>"
+                        for year, value in by_year.items())
+        html += "</table>"
+    return html
+
+def market_analytics_html():
+    """Computed market share / concentration tables and insights for the market page"""
+    analytics = market_analytics()
+    html = "<div style='background: #e8f4f8; padding: 20px; border-radius: 8px; margin-bottom: 30px;'><h3>Investment Insights</h3>"
+    if analytics.year is None:
+        return html + "<p>No production statistics available yet.</p></div>"
+    html += "<ul>" + "".join(f"<li>{text}</li>" for text in market_insights(analytics)) + "</ul></div>"
+
+    html += f"""
+    <h3>Country Market Share ({analytics.year})</h3>
+    <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 30px;">
+        <thead style="background: #f8f9fa;"><tr>
+            <th style="padding: 8px;">Country</th><th style="padding: 8px;">Production (tonnes)</th>
+            <th style="padding: 8px;">Revenue at Current Prices (USD)</th><th style="padding: 8px;">Revenue Share</th>
+            <th style="padding: 8px;">Export Value (Billion USD)</th><th style="padding: 8px;">Export Share</th>
+        </tr></thead><tbody>
+    """
+    html += "".join(f"""
+        <tr>
+            <td style="padding: 8px;"><strong>{html_escape(str(row['CountryName']))}</strong></td>
+            <td style="padding: 8px;">{row['Production_tonnes']:,.0f}</td>
+            <td style="padding: 8px;">{_fmt(row['Revenue'], ',.0f')}</td>
+            <td style="padding: 8px;">{_fmt(row['RevenueShare'], '.1%')}</td>
+            <td style="padding: 8px;">{row['ExportValue_BillionUSD']:,.2f}</td>
+            <td style="padding: 8px;">{_fmt(row['ExportShare'], '.1%')}</td>
+        </tr>""" for row in analytics.countries.to_dict("records"))
+    return html + "</tbody></table>"
+
 # Market Data (Investor Access)    
 @app.route("/market")
 @login_required
@@ -1071,61 +4006,144 @@ def market_data():
     if session.get("role") not in ["Administrator", "Investor"]:
         return "Access denied. Investor or Administrator role required.", 403
     
-    minerals_df = load_df(MINERAL_FILE)
-    production_df = load_df(PROD_TS_FILE)
-    
-    market_html = "<h1>Market Data & Investment Analysis</h1>"
+    query = parse_list_query(MINERAL_SORTS, MINERAL_FILTERS, "MineralID")
+    page = paginate(MINERAL_FILE, "MineralID", query)
+    minerals_df = with_text(page.rows, MINERAL_FILE, "MineralID")
+    try:
+        start, end = (int(request.args[k]) if request.args.get(k) else None for k in ("from", "to"))
+    except ValueError:
+        start = end = None
     
-    if not minerals_df.empty:
-        # Mineral price table
-        market_html += "<h3>Current Mineral Prices</h3>"
-        market_html += """
-        <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 30px;">
-            <thead style="background: #f8f9fa;">
+    def generate():
+        yield "<h1>Market Data & Investment Analysis</h1>"
+        
+        if count_rows(MINERAL_FILE) > 0:
+            # Mineral price table
+            yield "<h3>Current Mineral Prices</h3>" + list_controls_html(query, MINERAL_SORTS, MINERAL_FILTERS)
+            yield """
+            <table border="1" style="width: 100%; border-collapse: collapse; margin-bottom: 30px;">
+                <thead style="background: #f8f9fa;">
+                    <tr>
+                        <th style="padding: 10px;">Mineral</th>
+                        <th style="padding: 10px;">Description</th>
+                        <th style="padding: 10px;">Price (USD/tonne)</th>
+                    </tr>
+                </thead>
+                <tbody>
+            """
+            
+            for chunk in iter_row_chunks(minerals_df):
+                yield "".join(f"""
                 <tr>
-                    <th style="padding: 10px;">Mineral</th>
-                    <th style="padding: 10px;">Description</th>
-                    <th style="padding: 10px;">Price (USD/tonne)</th>
+                    <td style="padding: 10px;"><strong>{mineral['MineralName']}</strong></td>
+                    <td style="padding: 10px;">{mineral['Description']}</td>
+                    <td style="padding: 10px;">${mineral['MarketPriceUSD_per_tonne']:,.2f}</td>
                 </tr>
-            </thead>
-            <tbody>
-        """
+                """ for mineral in chunk.to_dict("records"))
+            
+            yield "</tbody></table>" + pagination_html(page)
         
-        for _, mineral in minerals_df.iterrows():
-            market_html += f"""
-            <tr>
-                <td style="padding: 10px;"><strong>{mineral['MineralName']}</strong></td>
-                <td style="padding: 10px;">{mineral['Description']}</td>
-                <td style="padding: 10px;">${mineral['MarketPriceUSD_per_tonne']:,.2f}</td>
-            </tr>
-            """
+        yield price_history_html(start, end)
         
-        market_html += "</tbody></table>"
-    
-    # Investment insights
-    market_html += """
-    <div style="background: #e8f4f8; padding: 20px; border-radius: 8px;">
-        <h3>Investment Insights</h3>
-        <ul>
-            <li><strong>Cobalt & Copper:</strong> DR Congo dominates global supply - high growth potential but consider political risk</li>
-            <li><strong>Platinum:</strong> South Africa controls 75% of global reserves - stable long-term investment</li>
-            <li><strong>Diamonds:</strong> Botswana leads in value - established mining operations with good governance</li>
-            <li><strong>Iron Ore:</strong> Guinea's Simandou project represents one of the world's largest untapped reserves</li>
-            <li><strong>Phosphates:</strong> Morocco controls 75% of global reserves - essential for agriculture</li>
-        </ul>
-    </div>
-    """
+        yield market_analytics_html()
+        
+        yield "<div style='margin-top: 30px;'><a href='/dashboard' style='padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;'>Back to Dashboard</a></div>"
     
-    market_html += "<div style='margin-top: 30px;'><a href='/dashboard' style='padding: 10px 20px; background: #6c757d; color: white; text-decoration: none; border-radius: 5px;'>Back to Dashboard</a></div>"
-    return market_html
+    return Response(stream_with_context(generate()), mimetype="text/html")
 
-if __name__ == "__main__":
-    print("Starting African Mining Data Portal...")
-    print("Access at: http://127.0.0.1:5000")
-    print("Initializing data...")
-    add_african_mineral_data()
-    print("Data initialization complete!")
-    app.run(debug=True, host="127.0.0.1", port=5000)
+# Metrics Endpoint
+# Behind the reverse proxy every request arrives from loopback, so the client
+# address proves nothing: scrapers send "Authorization: Bearer <MINING_METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get("MINING_METRICS_TOKEN")
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text format; for scrapers holding METRICS_TOKEN and logged-in administrators"""
+    auth = request.headers.get("Authorization", "")
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(auth.encode("utf-8"), f"Bearer {METRICS_TOKEN}".encode("utf-8"))
+    if not token_ok and session.get("role") != "Administrator":
+        return "Forbidden", 403
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Storage CLI
+@app.cli.command("db-import")
+def db_import_command():
+    """Load every CSV table into the SQLite database (MINING_DB)"""
+    db = SqliteBackend(SQLITE_FILE)
+    for filename, (table, _, _, _) in TABLE_SCHEMAS.items():
+        print(f"{table}: imported {db.import_csv(filename)} rows from {filename}")
 
+@app.cli.command("db-export")
+def db_export_command():
+    """Write every SQLite table back out to its CSV file"""
+    db = SqliteBackend(SQLITE_FILE)
+    for filename, (table, _, _, _) in TABLE_SCHEMAS.items():
+        print(f"{table}: exported {db.export_csv(filename)} rows to {filename}")
 
+@app.cli.command("import-data")
+@click.argument("dataset", type=click.Choice(sorted(IMPORT_SPECS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_data_command(dataset, path):
+    """Validate a CSV file and append it to a table in one atomic write"""
+    result = import_rows(dataset, path)
+    for line, message in result.errors:
+        print(f"line {line}: {message}")
+    if result.error_count:
+        raise SystemExit(f"{result.error_count} problem(s) found, nothing imported")
+    print(f"{dataset}: imported {result.rows} rows")
 
+# Serving
+def warm_up():
+    """Load every table and the derived indexes up front.
+
+    The gunicorn master calls this before forking so workers start with the
+    data already in memory and share those pages copy-on-write.
+    """
+    # Import the lazily loaded libraries now rather than in each worker's first request
+    for module in (pd, np, px, folium):
+        getattr(module, "__name__")
+    store.preload()
+    user_index.all()
+    for build in (role_index, country_index, mineral_index, mineral_price_index, country_production_summary,
+                  market_analytics, price_history, revenue_by_year_mineral, spatial_index, site_points, plotly_asset):
+        build()
+    for name in ROLLUP_KEYS:
+        production_rollups.frame(name)
+
+@app.cli.command("init-data")
+def init_data_command():
+    """Create missing CSV files and load the sample data into empty tables (run once before first start)"""
+    init_data()
+    print("Data files ready")
+
+@app.cli.command("generate-data")
+@click.argument("directory")
+@click.option("--countries", default=54, show_default=True)
+@click.option("--minerals", default=30, show_default=True)
+@click.option("--sites", default=10000, show_default=True)
+@click.option("--years", default="2000-2024", show_default=True, help="first-last year")
+@click.option("--users", default=100, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def generate_data_command(directory, countries, minerals, sites, years, users, seed):
+    """Write a seeded synthetic dataset (sites x years production rows) into DIRECTORY"""
+    first, last = (int(y) for y in years.split("-"))
+    written = generate_dataset(directory, countries, minerals, sites, (first, last), users, seed)
+    for filename, rows in written.items():
+        print(f"{filename}: {rows} rows")
+
+if __name__ == "__main__":
+    # Local serving only; production runs under gunicorn (gunicorn -c gunicorn.conf.py)
+    host = os.environ.get("MINING_HOST", "127.0.0.1")
+    port = int(os.environ.get("MINING_PORT", "5000"))
+    print("Starting African Mining Data Portal...")
+    print(f"Access at: http://{host}:{port}")
+    init_data()
+    warm_up()
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+    if serve is not None and not os.environ.get("MINING_DEBUG"):
+        serve(app, host=host, port=port, threads=int(os.environ.get("MINING_THREADS", "8")))
+    else:
+        app.run(debug=bool(os.environ.get("MINING_DEBUG")), host=host, port=port, threaded=True)
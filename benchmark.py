@@ -0,0 +1,239 @@
+"""Route benchmarks for the mining portal at scaled data sizes.
+
+Runs offline: for each scale the seed CSVs are multiplied into a temp
+directory and, for each route, a fresh child process drives the app there
+through Flask's test client with concurrent clients. One process per route
+keeps its peak RSS its own (ru_maxrss is a high-water mark for the whole
+process). Results are written as JSON so runs from different commits can be
+compared:
+
+    python benchmark.py --scales 10,100,1000 --output before.json
+    python benchmark.py --compare before.json --output after.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_ROUTES = [
+    "/dashboard", "/countries", "/country/1", "/minerals", "/market", "/charts", "/map",
+    "/admin", "/admin/users", "/admin/countries",
+    "/api/v1/countries", "/api/v1/trends", "/api/v1/sites/geojson?bbox=-20,-35,55,38&zoom=4",
+]
+
+# Tables multiplied by the scale factor; countries, minerals and roles are reference data
+SCALED_TABLES = {
+    "users.csv": "UserID",
+    "sites.csv": "SiteID",
+    "production_stats.csv": "StatID",
+    "prices.csv": None,
+    "production_timeseries.csv": None,
+}
+
+
+def scale_table(df, factor, id_col, rng):
+    """Repeat the seed rows `factor` times with fresh IDs and some variation"""
+    if df.empty or factor <= 1:
+        return df
+    copies = np.repeat(np.arange(factor), len(df))
+    out = pd.concat([df] * factor, ignore_index=True)
+    if id_col is not None:
+        out[id_col] = np.arange(1, len(out) + 1)
+    if "Username" in out.columns:
+        out["Username"] = out["Username"].astype(str) + np.where(copies > 0, "_" + copies.astype(str), "")
+        out["Email"] = out["Username"] + "@example.com"
+    if "SiteName" in out.columns:
+        out["SiteName"] = out["SiteName"].astype(str) + " " + copies.astype(str)
+    for col in ("Latitude", "Longitude"):
+        if col in out.columns:
+            out[col] = out[col] + rng.normal(0, 1.5, len(out)) * (copies > 0)
+    for col in ("Year", "year"):
+        if col in out.columns:
+            out[col] = out[col] - copies % 30
+    for col in ("Production_tonnes", "ExportValue_BillionUSD", "production_tonnes", "export_tonnes",
+                "average_price_usd_per_tonne"):
+        if col in out.columns:
+            out[col] = out[col] * rng.uniform(0.5, 1.5, len(out))
+    return out
+
+
+def prepare_data(directory, factor, seed=0):
+    """Copy the seed CSVs into directory, multiplying the SCALED_TABLES by factor"""
+    rng = np.random.default_rng(seed)
+    for name in os.listdir(REPO_DIR):
+        if name.endswith(".csv"):
+            shutil.copy(os.path.join(REPO_DIR, name), directory)
+    for name, id_col in SCALED_TABLES.items():
+        path = os.path.join(directory, name)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            scale_table(pd.read_csv(path), factor, id_col, rng).to_csv(path, index=False)
+    return {name: max(sum(1 for _ in open(os.path.join(directory, name))) - 1, 0)
+            for name in SCALED_TABLES if os.path.exists(os.path.join(directory, name))}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_routes(routes, requests, concurrency):
+    """Child process: import the app from the current directory's data and time each route"""
+    sys.path.insert(0, REPO_DIR)
+    started = time.perf_counter()
+    import COde
+    import_seconds = time.perf_counter() - started
+    baseline_rss = peak_rss_mb()
+
+    def client():
+        c = COde.app.test_client()
+        with c.session_transaction() as session:
+            session["username"] = "admin"
+            session["role"] = "Administrator"
+        return c
+
+    results = {}
+    for route in routes:
+        t = time.perf_counter()
+        response = client().get(route)
+        response.get_data()
+        cold = time.perf_counter() - t
+        status = response.status_code
+
+        latencies, errors, lock = [], 0, threading.Lock()
+        per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+        def worker(count):
+            nonlocal errors
+            c = client()
+            for _ in range(count):
+                t = time.perf_counter()
+                r = c.get(route)
+                r.get_data()
+                elapsed = time.perf_counter() - t
+                with lock:
+                    latencies.append(elapsed)
+                    errors += r.status_code >= 500
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in per_thread if n]
+        wall = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall
+
+        ms = [x * 1000 for x in latencies]
+        results[route] = {
+            "status": status,
+            "bytes": len(response.data),
+            "cold_ms": round(cold * 1000, 2),
+            "p50_ms": round(percentile(ms, 50), 2),
+            "p95_ms": round(percentile(ms, 95), 2),
+            "p99_ms": round(percentile(ms, 99), 2),
+            "mean_ms": round(statistics.fmean(ms), 2),
+            "throughput_rps": round(len(ms) / wall, 1) if wall else None,
+            "errors": errors,
+            "peak_rss_mb": peak_rss_mb(),
+            "rss_growth_mb": round(peak_rss_mb() - baseline_rss, 1),
+        }
+    return {"import_s": round(import_seconds, 3), "routes": results}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print p50/p95 changes against an earlier results file"""
+    print(f"\nvs {baseline.get('commit')}:")
+    for scale, run in current["scales"].items():
+        old = baseline.get("scales", {}).get(scale)
+        if not old:
+            continue
+        for route, stats in run["routes"].items():
+            before = old["routes"].get(route)
+            if not before:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if before[key]:
+                    change = (stats[key] - before[key]) / before[key] * 100
+                    print(f"  {scale:>5}x {route:<45} {key} {before[key]:>9.2f} -> {stats[key]:>9.2f} ({change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10,100,1000", help="comma-separated multiples of the seed data")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent test clients")
+    parser.add_argument("--route", action="append", dest="routes",
+                        help="route to time, repeatable (default: the main pages and APIs)")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    routes = args.routes or DEFAULT_ROUTES
+
+    if args.child:
+        json.dump(run_routes(routes, args.requests, args.concurrency), sys.stdout)
+        return
+
+    report = {"commit": git_commit(), "storage": args.storage, "requests": args.requests,
+              "concurrency": args.concurrency, "scales": {}}
+    for factor in (int(x) for x in args.scales.split(",")):
+        with tempfile.TemporaryDirectory(prefix=f"bench{factor}x-") as directory:
+            rows = prepare_data(directory, factor)
+            env = dict(os.environ, MINING_STORAGE=args.storage, MINING_DB=os.path.join(directory, "mining.db"),
+                       MAP_CACHE_DIR="", MINING_COLUMNAR_DIR=os.path.join(directory, ".columnar"))
+            if args.storage == "sqlite":
+                subprocess.run([sys.executable, "-m", "flask", "--app", os.path.join(REPO_DIR, "COde.py"),
+                                "db-import"], cwd=directory, env=env, check=True, stdout=subprocess.DEVNULL)
+            run = {"import_s": None, "routes": {}, "rows": rows}
+            for route in routes:
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests),
+                     "--concurrency", str(args.concurrency), f"--route={route}"],
+                    cwd=directory, env=env, check=True, capture_output=True, text=True)
+                result = json.loads(child.stdout.strip().splitlines()[-1])
+                run["import_s"] = max(run["import_s"] or 0, result["import_s"])
+                run["routes"].update(result["routes"])
+            report["scales"][str(factor)] = run
+
+        print(f"\n{factor}x  (import {run['import_s']}s, rows {rows})")
+        print(f"  {'route':<45} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'rss MB':>8} {'+MB':>8}")
+        for route, stats in run["routes"].items():
+            print(f"  {route:<45} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                  f"{stats['throughput_rps']:>8.1f} {stats['peak_rss_mb']:>8.1f} {stats['rss_growth_mb']:>8.1f}"
+                  + ("" if stats["status"] < 400 else f"  [{stats['status']}]"))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
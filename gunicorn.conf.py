@@ -0,0 +1,40 @@
+# Production server settings: gunicorn -c gunicorn.conf.py
+# On a new deployment create the data files first: flask --app COde init-data
+# Every value can be overridden from the environment.
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "COde:app"
+bind = os.environ.get("MINING_BIND", "127.0.0.1:8000")
+
+# Processes x threads; the tables are read-only in memory so threads scale well
+workers = int(os.environ.get("MINING_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("MINING_THREADS", "4"))
+
+# Load the app and its data once in the master, then fork
+preload_app = True
+
+# Recycle workers after a number of requests (jittered so they don't all
+# restart together) and let in-flight requests finish on reload/shutdown
+max_requests = int(os.environ.get("MINING_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.environ.get("MINING_MAX_REQUESTS_JITTER", "200"))
+graceful_timeout = int(os.environ.get("MINING_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("MINING_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = os.environ.get("MINING_ACCESS_LOG", "-")
+
+
+def when_ready(server):
+    import COde
+    COde.warm_up()
+    # Keep the garbage collector from touching (and so copying) the preloaded objects
+    gc.freeze()
+    server.log.info("Data store preloaded")
+
+
+def post_fork(server, worker):
+    import COde
+    COde.backend.after_fork()
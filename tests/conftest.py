@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import COde
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Run against a fresh copy of the sample data in a temp directory"""
+    monkeypatch.chdir(tmp_path)
+    COde.store.invalidate()
+    COde.init_data()
+    yield tmp_path
+    COde.store.invalidate()
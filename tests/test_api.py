@@ -0,0 +1,56 @@
+import COde
+
+
+def client():
+    c = COde.app.test_client()
+    with c.session_transaction() as s:
+        s["username"] = "admin"
+        s["role"] = "Administrator"
+    return c
+
+
+def test_production_is_paged(data_dir):
+    c = client()
+    total = COde.count_rows(COde.PROD_TS_FILE)
+    ids, url = [], "/api/v1/production?per_page=10"
+    while url:
+        body = c.get(url).get_json()
+        assert body["total"] == total and len(body["production"]) <= 10
+        ids += [row["StatID"] for row in body["production"]]
+        url = body["next_cursor"] and f"/api/v1/production?per_page=10&after={body['next_cursor']}"
+    assert ids == sorted(COde.load_df(COde.PROD_TS_FILE)["StatID"].tolist())
+
+
+def test_production_filters_and_rejects_bad_params(data_dir):
+    c = client()
+    body = c.get("/api/v1/production?MineralID=1&sort=Year&order=desc").get_json()
+    years = [row["Year"] for row in body["production"]]
+    assert body["total"] == len(years) > 0
+    assert all(row["MineralID"] == 1 for row in body["production"]) and years == sorted(years, reverse=True)
+    assert c.get("/api/v1/production?Year=abc").status_code == 400
+    assert c.get("/api/v1/production?per_page=x").status_code == 400
+
+
+def test_etag_is_weak_and_revalidates(data_dir):
+    c = client()
+    first = c.get("/api/v1/minerals")
+    assert first.headers["ETag"].startswith('W/"')
+    assert c.get("/api/v1/minerals", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_spatial_site_queries_share_the_v1_filters(data_dir):
+    c = client()
+    sites = c.get("/api/v1/sites?MineralID=1").get_json()["sites"]
+    found = c.get("/api/v1/sites/search?bbox=-180,-90,180,90&MineralID=1").get_json()["sites"]
+    assert sorted(s["SiteID"] for s in found) == sorted(s["SiteID"] for s in sites)
+    assert set(sites[0]) <= set(found[0])
+
+    site = sites[0]
+    near = c.get(f"/api/v1/sites/nearest?lat={site['Latitude']}&lon={site['Longitude']}&k=1&MineralID=1").get_json()
+    assert near["sites"][0]["SiteID"] == site["SiteID"] and near["sites"][0]["Distance_km"] == 0
+    within = c.get(f"/api/v1/sites/within?lat={site['Latitude']}&lon={site['Longitude']}&radius_km=1&CountryID={site['CountryID']}")
+    assert site["SiteID"] in [s["SiteID"] for s in within.get_json()["sites"]]
+
+    assert c.get("/api/v1/sites/search?bbox=-180,-90,180,90&MineralID=gold").status_code == 400
+    assert c.get(f"/api/v1/sites/{site['SiteID']}/popup").status_code == 200
+    assert c.get("/api/sites/search?bbox=-180,-90,180,90").status_code == 404
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import COde
+
+
+def test_cache_dir_is_anchored_to_the_app(data_dir, monkeypatch):
+    monkeypatch.setattr(COde, "HAVE_PYARROW", True)
+    cache = COde.ColumnarCache(".columnar")
+    assert cache.directory == os.path.join(COde.APP_DIR, ".columnar")
+    assert cache._prefix(COde.MINERAL_FILE) != cache._prefix(os.path.join("elsewhere", COde.MINERAL_FILE))
+
+
+def test_no_pickle_fallback_without_pyarrow(data_dir, monkeypatch):
+    monkeypatch.setattr(COde, "HAVE_PYARROW", False)
+    cache = COde.ColumnarCache(str(data_dir / ".columnar"))
+    sig = COde.CsvBackend().signature(COde.MINERAL_FILE)
+    cache.store(COde.MINERAL_FILE, sig, COde.load_df(COde.MINERAL_FILE))
+    assert cache.directory == "" and cache.load(COde.MINERAL_FILE, sig) is None
+    assert not (data_dir / ".columnar").exists()
+
+
+def test_feather_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    cache = COde.ColumnarCache(str(tmp_path / ".columnar"))
+    df = pd.DataFrame({
+        "ID": np.arange(1, 7, dtype="int32"),
+        "Year": np.array([2020, 2021, 2021, 2022, 2023, 2024], dtype="int16"),
+        "Price": [1.5, np.nan, 3.0, 4.0, 5.0, 6.5],
+        "Mineral": pd.Categorical(["Gold", "Iron", "Gold", "Zinc", "Iron", "Gold"]),
+        "Name": ["a", "b", None, "d", "e", "f"],
+        "Notes": ["long text"] * 6,
+    })
+    cache.store("table.csv", (1, 100), df)
+    assert cache.load("table.csv", (2, 100)) is None  # another version of the CSV
+
+    loaded = cache.load("table.csv", (1, 100))
+    pd.testing.assert_frame_equal(loaded, df)
+
+    pd.testing.assert_frame_equal(cache.load("table.csv", (1, 100), exclude=["Notes", "Missing"]), df.drop(columns="Notes"))
+    pd.testing.assert_frame_equal(cache.load("table.csv", (1, 100), columns=["ID", "Notes"]), df[["ID", "Notes"]])
+    picked = cache.load("table.csv", (1, 100), columns=["ID", "Mineral"], rows=("ID", [5, 2]))
+    pd.testing.assert_frame_equal(picked, df.loc[[1, 4], ["ID", "Mineral"]].reset_index(drop=True))
+
+    cache.store("table.csv", (3, 120), df.iloc[:3])
+    assert len(os.listdir(cache.directory)) == 1  # the stale copy is removed
+    pd.testing.assert_frame_equal(cache.load("table.csv", (3, 120)), df.iloc[:3])
+
+
+def test_large_numeric_columns_are_not_copied(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    cache = COde.ColumnarCache(str(tmp_path / ".columnar"))
+    n = 100_000  # more than one default Feather chunk
+    df = pd.DataFrame({"ID": np.arange(n, dtype="int32"), "CountryID": np.arange(n, dtype="int32") % 50,
+                       "Value": np.linspace(0, 1, n)})
+    cache.store("big.csv", (1, 1), df)
+    cache.load("big.csv", (1, 1))  # warm up
+    before = pa.total_allocated_bytes()
+    loaded = cache.load("big.csv", (1, 1))
+    assert pa.total_allocated_bytes() - before < df.memory_usage().sum() // 10  # views of the mapped file
+    pd.testing.assert_frame_equal(loaded, df)
@@ -0,0 +1,30 @@
+import os
+import threading
+
+import COde
+
+
+def test_regenerating_live_data_resets_id_sequence(data_dir):
+    COde.append_row(COde.USER_FILE, {"Username": "before", "PasswordHash": "x", "RoleID": 3, "Email": ""}, "UserID")
+    with open(COde.USER_FILE + ".seq", "w") as f:
+        f.write("500")  # last ID issued from the old, larger table
+    written = COde.generate_dataset(".", countries=5, minerals=4, sites=20, years=(2020, 2021), users=30)
+    COde.store.invalidate()
+
+    assert written[COde.USER_FILE] == COde.count_rows(COde.USER_FILE) == 30
+    assert written[COde.PROD_TS_FILE] == COde.count_rows(COde.PROD_TS_FILE) == 40
+    row = COde.append_row(COde.USER_FILE, {"Username": "after", "PasswordHash": "x", "RoleID": 3, "Email": ""}, "UserID")
+    assert row["UserID"] == 31
+    assert not [name for name in os.listdir(data_dir) if name.endswith(".tmp")]
+
+
+def test_generation_waits_for_table_lock(data_dir):
+    done = threading.Event()
+    with COde.file_lock(os.path.join(".", COde.USER_FILE)):
+        worker = threading.Thread(target=lambda: (COde.generate_dataset(".", countries=3, minerals=2, sites=5,
+                                                                        years=(2020, 2020), users=3), done.set()))
+        worker.start()
+        assert not done.wait(0.5)
+        assert COde.count_rows(COde.USER_FILE) != 3
+    worker.join()
+    assert done.is_set()
@@ -0,0 +1,45 @@
+import io
+
+import pandas as pd
+
+import COde
+
+
+def site_csv(*site_ids):
+    rows = "".join(f"{site_id},Site {i},1,1,-10.5,25.5,1000\n" for i, site_id in enumerate(site_ids))
+    return io.StringIO("SiteID,SiteName,CountryID,MineralID,Latitude,Longitude,Production_tonnes\n" + rows)
+
+
+def site_ids():
+    return pd.read_csv(COde.DEPOSITS_FILE)["SiteID"]
+
+
+def test_blank_ids_skip_explicit_ids_in_the_same_chunk(data_dir):
+    next_id = int(site_ids().max()) + 1
+    result = COde.import_rows("sites", site_csv("", "", next_id + 1))
+    assert result.error_count == 0 and result.rows == 3
+    assert site_ids().is_unique
+
+
+def test_blank_ids_skip_explicit_ids_in_later_chunks(data_dir):
+    next_id = int(site_ids().max()) + 1
+    result = COde.import_rows("sites", site_csv("", "", next_id, next_id + 1), chunksize=2)
+    assert result.error_count == 0 and result.rows == 4
+    ids = site_ids()
+    assert ids.is_unique
+    assert {next_id, next_id + 1} <= set(ids)
+
+
+def test_explicit_id_already_in_table_is_rejected(data_dir):
+    existing = int(site_ids().iloc[0])
+    before = len(site_ids())
+    result = COde.import_rows("sites", site_csv("", existing))
+    assert result.error_count == 1 and "duplicate SiteID" in result.errors[0][1]
+    assert len(site_ids()) == before
+
+
+def test_fill_ids_numbers_blanks_after_explicit_ids():
+    chunk = pd.DataFrame({"ID": [None, None, 101]})
+    filled, next_id = COde._fill_ids(chunk, "ID", 100)
+    assert filled["ID"].tolist() == [102, 103, 101]
+    assert next_id == 104
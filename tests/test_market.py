@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import COde
+
+
+def production(*rows):
+    return pd.DataFrame(rows, columns=["Year", "CountryID", "MineralID", "Production_tonnes", "ExportValue_BillionUSD"])
+
+
+def test_market_shares_hhi_and_growth(data_dir):
+    price = COde.mineral_price_index()
+    analytics = COde._build_market_analytics(production(
+        # Mineral 1: an even four-way split in 2024, doubled from 2023
+        (2023, 1, 1, 200, 1.0),
+        (2024, 1, 1, 100, 1.0), (2024, 2, 1, 100, 1.0), (2024, 3, 1, 100, 1.0), (2024, 4, 1, 100, 1.0),
+        # Mineral 2: 75/25 between two countries, no 2023 output
+        (2024, 1, 2, 300, 2.0), (2024, 2, 2, 100, 0.0),
+        # Mineral 3: one producer, and zero output the year before
+        (2023, 5, 3, 0, 0.0), (2024, 5, 3, 50, 4.0),
+    ), None, None)
+    assert analytics.year == 2024
+
+    minerals = analytics.minerals.set_index("MineralID")
+    assert minerals.loc[1, "HHI"] == pytest.approx(2500) and COde.hhi_band(minerals.loc[1, "HHI"]) == "highly concentrated"
+    assert minerals.loc[2, "HHI"] == pytest.approx(75 ** 2 + 25 ** 2)
+    assert minerals.loc[3, "HHI"] == pytest.approx(10000)
+    assert minerals.loc[2, "TopCountry"] == COde.get_country_name(1) and minerals.loc[2, "TopShare"] == 0.75
+    assert minerals.loc[1, "Growth"] == pytest.approx(1.0)
+    assert math.isnan(minerals.loc[2, "Growth"]) and math.isnan(minerals.loc[3, "Growth"])
+    assert minerals.loc[2, "Revenue"] == pytest.approx(400 * price[2])
+
+    shares = analytics.shares
+    assert np.allclose(shares.groupby("MineralID")["Share"].sum(), 1.0)
+    countries = analytics.countries.set_index("CountryID")
+    assert countries["RevenueShare"].sum() == pytest.approx(1.0)
+    assert countries.loc[1, "ExportShare"] == pytest.approx(3.0 / 10.0)
+
+
+def test_hhi_bands():
+    assert [COde.hhi_band(h) for h in (0, 1499.9, 1500, 2499.9, 2500, 10000)] == [
+        "competitive", "competitive", "moderately concentrated", "moderately concentrated",
+        "highly concentrated", "highly concentrated"]
+
+
+def test_empty_production_gives_empty_analytics(data_dir):
+    analytics = COde._build_market_analytics(pd.DataFrame(), None, None)
+    assert analytics.year is None and analytics.minerals.empty and analytics.shares.empty
@@ -0,0 +1,92 @@
+import base64
+import json
+
+import pandas as pd
+import pytest
+
+import COde
+
+# Prices tie in pairs and two are missing; one name is missing
+MINERALS = pd.DataFrame({
+    "MineralID": [1, 2, 3, 4, 5, 6, 7, 8],
+    "MineralName": ["Gold", "Copper", None, "Cobalt", "Iron", "Zinc", "Tin", "Lead"],
+    "Description": [""] * 8,
+    "MarketPriceUSD_per_tonne": [500.0, 100.0, 500.0, None, 100.0, 500.0, None, 250.0],
+})
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def minerals(request, data_dir, monkeypatch):
+    MINERALS.to_csv(COde.MINERAL_FILE, index=False)
+    if request.param == "sqlite":
+        db = COde.SqliteBackend(str(data_dir / "mining.db"))
+        db.import_csv(COde.MINERAL_FILE)
+        monkeypatch.setattr(COde, "backend", db)
+    return MINERALS
+
+
+def write_minerals(df):
+    if COde.backend.name == "sqlite":
+        COde.backend.replace(COde.MINERAL_FILE, df)
+    else:
+        df.to_csv(COde.MINERAL_FILE, index=False)
+
+
+def walk(sort, descending, limit=2):
+    """IDs of every page, following next_cursor from the first page"""
+    ids, after = [], None
+    while True:
+        page = COde.paginate(COde.MINERAL_FILE, "MineralID", COde.ListQuery(sort, descending, {}, after, limit))
+        ids += page.rows["MineralID"].tolist()
+        if page.next_cursor is None:
+            return ids
+        after = page.next_cursor
+
+
+def expected(df, sort, descending):
+    present = df[df[sort].notna()].sort_values([sort, "MineralID"], ascending=not descending)
+    missing = df[df[sort].isna()].sort_values("MineralID", ascending=not descending)
+    return present["MineralID"].tolist() + missing["MineralID"].tolist()
+
+
+@pytest.mark.parametrize("sort", ["MarketPriceUSD_per_tonne", "MineralName", "MineralID"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_pages_cover_ties_and_nulls_exactly_once(minerals, sort, descending, limit):
+    assert walk(sort, descending, limit) == expected(minerals, sort, descending)
+
+
+@pytest.mark.parametrize("sort", ["MarketPriceUSD_per_tonne", "MineralName"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 3, 4, 5])
+def test_resumes_after_deleted_cursor_row(minerals, sort, descending, limit):
+    first = COde.paginate(COde.MINERAL_FILE, "MineralID", COde.ListQuery(sort, descending, {}, None, limit))
+    cursor_id = first.rows["MineralID"].iloc[-1]
+    order = expected(minerals, sort, descending)
+    write_minerals(minerals[minerals["MineralID"] != cursor_id])
+
+    page = COde.paginate(COde.MINERAL_FILE, "MineralID", COde.ListQuery(sort, descending, {}, first.next_cursor, 10))
+    assert page.rows["MineralID"].tolist() == order[order.index(cursor_id) + 1:]
+
+
+def test_cursor_from_other_column_restarts(minerals):
+    cursor = COde.encode_cursor("Gold", 1)
+    page = COde.paginate(COde.MINERAL_FILE, "MineralID",
+                         COde.ListQuery("MarketPriceUSD_per_tonne", False, {}, cursor, 3))
+    assert page.rows["MineralID"].tolist() == expected(MINERALS, "MarketPriceUSD_per_tonne", False)[:3]
+
+
+@pytest.mark.parametrize("cursor", [[1, {"a": 1}], [{"a": 1}, 1], [[1], 2], ["Gold", "3"], ["Gold", 1.5],
+                                    ["Gold", True], [2**70, 1], ["Gold", 2**64], "x", [1, 2, 3]])
+def test_malformed_cursor_starts_over(minerals, cursor):
+    after = base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+    page = COde.paginate(COde.MINERAL_FILE, "MineralID", COde.ListQuery("MineralName", False, {}, after, 3))
+    assert page.rows["MineralID"].tolist() == expected(minerals, "MineralName", False)[:3]
+
+
+def test_malformed_cursor_is_not_a_server_error(minerals):
+    client = COde.app.test_client()
+    with client.session_transaction() as s:
+        s["username"], s["role"] = "admin", "Administrator"
+    after = base64.urlsafe_b64encode(json.dumps([1, {"a": 1}]).encode("utf-8")).decode("ascii")
+    assert client.get(f"/minerals?after={after}").status_code == 200
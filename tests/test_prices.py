@@ -0,0 +1,52 @@
+import math
+
+import pandas as pd
+import pytest
+
+import COde
+
+# Gold skips 2002; Copper has two rows for 2001 that are averaged
+PRICES = pd.DataFrame({
+    "mineral": ["Gold", "Gold", "Gold", "Copper", "Copper", "Copper", "Copper"],
+    "year": [2000, 2001, 2003, 2000, 2001, 2001, 2002],
+    "average_price_usd_per_tonne": [100.0, 110.0, 121.0, 100.0, 110.0, 130.0, 90.0],
+})
+
+
+@pytest.fixture
+def history():
+    return COde.PriceHistory(PRICES)
+
+
+def test_gap_year_breaks_the_return_chain(history):
+    returns = history.returns()
+    assert returns.loc[2001, "Gold"] == pytest.approx(0.10)
+    assert math.isnan(returns.loc[2002, "Gold"]) and math.isnan(returns.loc[2003, "Gold"])
+    assert returns.loc[2001, "Copper"] == pytest.approx(0.20)
+    assert returns.loc[2002, "Copper"] == pytest.approx(-0.25)
+
+
+def test_summary_cagr_and_volatility(history):
+    summary = history.summary().set_index("mineral")
+    assert summary.loc["Gold", ["first_year", "last_year"]].tolist() == [2000, 2003]
+    assert summary.loc["Gold", "cagr"] == pytest.approx(1.21 ** (1 / 3) - 1)
+    assert summary.loc["Copper", "cagr"] == pytest.approx(0.9 ** 0.5 - 1)
+    assert summary.loc["Copper", "volatility"] == pytest.approx(0.45 / math.sqrt(2))
+    assert math.isnan(summary.loc["Gold", "volatility"])  # a single return has no spread
+
+    recent = history.summary(start=2002).set_index("mineral")
+    assert recent.loc["Gold", "first_price"] == 121.0 and math.isnan(recent.loc["Gold", "cagr"])
+
+
+def test_price_at_uses_latest_price_at_or_before_the_year(history):
+    prices = history.price_at(["Gold", "Gold", "Gold", "Gold", "Copper", "Tin"], [1999, 2000, 2002, 2010, 2001, 2001])
+    assert math.isnan(prices[0])  # before the first recorded year
+    assert prices[1:5].tolist() == [100.0, 110.0, 121.0, 120.0]
+    assert math.isnan(prices[5])  # mineral without prices
+
+
+def test_resample_buckets_from_the_first_year(history):
+    buckets = history.resample(2)
+    assert buckets.index.tolist() == [2000, 2002]
+    assert buckets.loc[2000, "Gold"] == pytest.approx(105.0) and buckets.loc[2002, "Gold"] == 121.0
+    assert history.series("Gold", 2001, 2003).to_dict() == {2001: 110.0, 2003: 121.0}
@@ -0,0 +1,23 @@
+import os
+
+import COde
+
+
+def cached_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".html"))
+
+
+def test_disk_copies_are_bounded_like_memory(tmp_path):
+    cache = COde.RenderCache(maxsize=3, directory=str(tmp_path))
+    for version in range(10):
+        cache.put(("map", version), f"<div>{version}</div>")
+    assert cached_files(tmp_path) == sorted(os.path.basename(cache._path(("map", v))) for v in (7, 8, 9))
+
+    # A restarted worker reads a disk copy, which counts as a use
+    restarted = COde.RenderCache(maxsize=3, directory=str(tmp_path))
+    for version, stamp in ((7, 1), (8, 2), (9, 3)):
+        os.utime(restarted._path(("map", version)), ns=(stamp, stamp))
+    assert restarted.get(("map", 7)) == "<div>7</div>"
+    restarted.put(("map", 10), "<div>10</div>")
+    assert restarted.get(("map", 8)) is None
+    assert restarted.get(("map", 7)) == "<div>7</div>"
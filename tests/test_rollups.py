@@ -0,0 +1,90 @@
+import io
+
+import pandas as pd
+import pytest
+
+import COde
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def rollups(request, data_dir, monkeypatch):
+    if request.param == "sqlite":
+        db = COde.SqliteBackend(str(data_dir / "mining.db"))
+        for filename in COde.TABLE_SCHEMAS:
+            db.import_csv(filename)
+        monkeypatch.setattr(COde, "backend", db)
+        monkeypatch.setattr(COde.store, "backend", db)
+        COde.store.invalidate()
+    # The module instance is the registered append listener; start it from scratch
+    monkeypatch.setattr(COde.production_rollups, "_totals", None)
+    return COde.production_rollups
+
+
+@pytest.fixture
+def group_by_calls(monkeypatch):
+    calls = []
+    aggregate = COde.aggregate_sum
+
+    def counting(filename, by, values):
+        calls.append(tuple(by))
+        return aggregate(filename, by, values)
+
+    monkeypatch.setattr(COde, "aggregate_sum", counting)
+    return calls
+
+
+def production_rows(*rows):
+    return pd.DataFrame(rows, columns=["StatID", "Year", "CountryID", "MineralID", "Production_tonnes", "ExportValue_BillionUSD"])
+
+
+def assert_matches_table(instance):
+    table = COde.load_df(COde.PROD_TS_FILE)
+    for name, keys in COde.ROLLUP_KEYS.items():
+        expected = table.groupby(keys)[COde.ROLLUP_VALUES].sum().reset_index().astype({k: "int64" for k in keys})
+        pd.testing.assert_frame_equal(instance.frame(name), expected, check_dtype=False)
+
+
+def test_appends_patch_rollups_without_regrouping(rollups, group_by_calls):
+    assert_matches_table(rollups)
+    assert len(group_by_calls) == len(COde.ROLLUP_KEYS)
+
+    # One existing key combination and one new year
+    COde.bulk_append(COde.PROD_TS_FILE, [production_rows((None, 2023, 1, 1, 500, 0.5),
+                                                         (None, 2031, 2, 3, 700, 1.25))], "StatID")
+    COde.import_rows("production_stats", io.StringIO(
+        "StatID,Year,CountryID,MineralID,Production_tonnes,ExportValue_BillionUSD\n"
+        ",2031,2,3,300,0.75\n,2023,3,2,40,\n"))
+    COde.append_row(COde.PROD_TS_FILE, {"Year": 2024, "CountryID": 1, "MineralID": 2,
+                                        "Production_tonnes": 10, "ExportValue_BillionUSD": 0.1}, "StatID")
+
+    assert_matches_table(rollups)
+    assert len(group_by_calls) == len(COde.ROLLUP_KEYS)  # patched, never regrouped
+    assert rollups.frame("year_mineral").query("Year == 2031 and MineralID == 3")["Production_tonnes"].item() == 1000
+
+
+def test_other_workers_adopt_saved_totals(rollups, group_by_calls, monkeypatch):
+    rollups.frame("year_mineral")
+    COde.bulk_append(COde.PROD_TS_FILE, [production_rows((None, 2030, 1, 1, 100, 1.0))], "StatID")
+    calls = len(group_by_calls)
+
+    # A worker starting now reads the saved state for the current table version
+    fresh = COde.ProductionRollups()
+    assert_matches_table(fresh)
+    assert len(group_by_calls) == calls
+
+    # A worker whose totals are older adopts the saved state before patching its own append
+    stale = COde.ProductionRollups()
+    stale._set(("old", 0), {name: {} for name in COde.ROLLUP_KEYS})
+    monkeypatch.setattr(COde, "_append_listeners", {COde.PROD_TS_FILE: [stale.record_append]})
+    COde.bulk_append(COde.PROD_TS_FILE, [production_rows((None, 2030, 1, 1, 50, 0.5))], "StatID")
+    assert_matches_table(stale)
+    assert_matches_table(COde.ProductionRollups())
+    assert len(group_by_calls) == calls
+
+
+def test_saved_totals_for_another_table_version_are_ignored(rollups, group_by_calls):
+    rollups.frame("year_mineral")
+    COde.save_df(COde.load_df(COde.PROD_TS_FILE).iloc[:-1], COde.PROD_TS_FILE)  # not an append
+    calls = len(group_by_calls)
+    assert_matches_table(COde.ProductionRollups())
+    assert len(group_by_calls) == calls + len(COde.ROLLUP_KEYS)
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+import COde
+
+
+@pytest.fixture(params=["csv", "columnar", "sqlite"])
+def source(request, data_dir, monkeypatch):
+    if request.param == "sqlite":
+        db = COde.SqliteBackend(str(data_dir / "mining.db"))
+        db.import_csv(COde.MINERAL_FILE)
+    elif request.param == "columnar":
+        pytest.importorskip("pyarrow")
+        db = COde.CsvBackend(str(data_dir / ".columnar"))
+        db.read_table(COde.MINERAL_FILE)  # writes the Feather copy
+    else:
+        db = COde.CsvBackend("")
+    monkeypatch.setattr(COde, "backend", db)
+    monkeypatch.setattr(COde.store, "backend", db)
+    COde.store.invalidate()
+    COde.text_cache.clear()
+    return request.param
+
+
+def test_reads_text_for_just_the_given_rows(source):
+    full = pd.read_csv(COde.MINERAL_FILE)
+    rows = COde.load_df(COde.MINERAL_FILE).iloc[[2, 0]]
+    assert "Description" not in rows.columns
+
+    shown = COde.with_text(rows, COde.MINERAL_FILE, "MineralID")
+    expected = full.set_index("MineralID").loc[rows["MineralID"], "Description"].tolist()
+    assert shown["MineralID"].tolist() == rows["MineralID"].tolist()
+    assert shown["Description"].tolist() == expected
+    assert not any(name.startswith("text:") for name in COde.store._derived)
+
+    read = COde.backend.read_text(COde.MINERAL_FILE, "MineralID", ["Description"], rows["MineralID"].tolist())
+    assert sorted(read["MineralID"].tolist()) == sorted(rows["MineralID"].tolist())